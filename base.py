@@ -1,6 +1,7 @@
 from abc import ABC, abstractmethod
 import numpy as np
-from PyQt6.QtGui import QImage
+
+from field import NoiseField, mip_chain, normalize
 
 
 
@@ -25,21 +26,112 @@ class NoiseGenerator(ABC):
         """
         pass
 
+    # Region API used by tiled renders (see render.py). setup() takes the
+    # same params as generate(), evaluate() returns the field for pixel
+    # coords xs (rows) by ys (columns) before normalization. Generators with
+    # normalized = True are rescaled by the global min/max afterwards.
+    normalized = True
+    # Generators that keep intermediate layers between evaluate() calls (see
+    # noises.py) skip their caches while this is False, e.g. for tiles that
+    # are evaluated once
+    use_cache = True
+
+    def setup(self, params: dict):
+        raise NotImplementedError
+
+    def evaluate(self, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    # Fixed (low, high) of evaluate() output, for callers that only see part
+    # of the field and can't use its min/max (see viewport.py). None if
+    # unknown.
+    def value_bounds(self):
+        return None if self.normalized else (0.0, 1.0)
+
+    # Full precision output, see field.py. generate() stays the uint8 RGB view.
+    # mips=True also builds the mip chain (mip_levels long, default down to
+    # 1x1) into field.mipmaps, export.write_mips writes it as is.
+    def generate_field(self, params: dict, mips: bool = False, mip_levels: int = None) -> NoiseField:
+        if not supports_regions(self):
+            field = NoiseField.from_rgb8(self.generate(params), generator=type(self).__name__, params=params)
+        else:
+            self.setup(params)
+            coords = np.arange(params["size"], dtype=np.float64)
+            field = self.make_field(self.evaluate(coords, coords), params)
+        if mips:
+            field.mipmaps = mip_chain(field.data, mip_levels)[1:]
+        return field
+
+    # Renders of params for every seed, as one (N, h, w) or (N, h, w, 3)
+    # float32 stack whose slice k equals generate_field() with seeds[k].
+    # Generators override this to share the work that doesn't depend on the
+    # seed across the batch.
+    # Overrides hand sizes below batch_min_size back to this loop, small
+    # renders gain less from sharing than the batch setup costs.
+    batch_min_size = 0
+
+    def generate_batch(self, params: dict, seeds) -> np.ndarray:
+        seeds = batch_seeds(params, seeds)
+        return np.stack([self.generate_field(dict(params, seed=seed)).data for seed in seeds])
+
+    def make_field(self, noise_data: np.ndarray, params: dict) -> NoiseField:
+        data, value_range = normalize(noise_data, self.normalized)
+        return NoiseField(data, type(self).__name__, params, value_range)
+
     def get_data(self) -> np.ndarray:
         return self.data
 
-    def to_qimage(self) -> QImage:
+    def to_qimage(self) -> "QImage":
+        # Qt is only needed for display, keep it out of headless imports
+        from PyQt6.QtGui import QImage
+
         data = self.generate()
         h, w = data.shape[:2]
         return QImage(data.data, w, h, 3 * w, QImage.Format.Format_RGB888).copy()
 
 
 
+def supports_regions(generator: NoiseGenerator) -> bool:
+    return type(generator).evaluate is not NoiseGenerator.evaluate
+
+
+# Seeds of a batch, given as ints or as param dicts that differ from params
+# only in "seed"
+def batch_seeds(params: dict, seeds) -> list:
+    result = []
+    for seed in seeds:
+        if isinstance(seed, dict):
+            if dict(params, **seed) != dict(params, seed=seed["seed"]):
+                raise ValueError("Batch param sets may only differ in seed")
+            seed = seed["seed"]
+        result.append(seed)
+    if not result:
+        raise ValueError("Batch needs at least one seed")
+    return result
+
+
+
 class NoiseModifier(ABC):
+    # Pointwise modifiers map every uint8 value on its own, so they can be
+    # folded into a 256 entry lookup table (see modifiers.ModifierStack).
+    pointwise = True
+
     @abstractmethod
     def apply(self, image: np.ndarray, params: dict) -> np.ndarray:
         pass
 
+    def lut(self, params: dict) -> np.ndarray:
+        return self.apply(np.arange(256, dtype=np.uint8), params)
+
+    # Same modifier on float32 values in [0, 1], in place. The default
+    # interpolates lut() so every pointwise modifier works on fields.
+    def apply_float(self, data: np.ndarray, params: dict) -> np.ndarray:
+        if not self.pointwise:
+            raise NotImplementedError
+        lut = self.lut(params).astype(np.float32) * np.float32(1.0 / 255.0)
+        data[...] = np.interp(data, np.linspace(0.0, 1.0, 256), lut)
+        return data
+
     @abstractmethod
     def get_ui_schema(self) -> dict:
         pass
\ No newline at end of file
@@ -0,0 +1,253 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from registry import GENERATORS, MODIFIERS, default_params
+from cache import canonical_params
+from field import NoiseField
+from modifiers import ModifierStack
+from render import render_tiled
+
+################
+#
+#  Throughput benchmarks for generators, modifiers and display conversion.
+#
+#    python benchmark.py --out bench.json
+#    python benchmark.py --sizes 64 256 --baseline bench.json --threshold 0.2
+#
+#  Every case reports wall time (best of --repeat, or the median of at
+#  least FAST_REPEAT runs for cases under FAST_SECONDS), pixels/sec and
+#  peak traced memory. Sizes above IN_MEMORY_MAX go through render_tiled.
+#  With --baseline, cases slower than baseline * (1 + threshold) and by
+#  more than --min-delta-ms are listed as regressions and the exit code is 1.
+#
+################
+
+SIZES = [64, 256, 1024, 4096]
+LARGE_SIZES = [8192, 16384]
+IN_MEMORY_MAX = 4096
+
+# Extra param sets per generator on top of the defaults
+VARIANTS = {
+    "PerlinNoise": [{"octaves": 1}, {"octaves": 4}, {"octaves": 8}, {"grid_size": 4}, {"grid_size": 64}],
+    "SimplexNoise": [{"octaves": 1}, {"octaves": 4}, {"octaves": 8}],
+    "WorleyNoise": [{"mode": "F1"}, {"mode": "F2 - F1"}, {"mode": "sqrt(F2 * F1)"},
+                    {"grid_size": 4}, {"grid_size": 64}],
+    "WhiteNoise": [{"colored": False}, {"colored": True}],
+}
+
+
+# Cases this fast are mostly timer and scheduler noise: they run at least
+# FAST_REPEAT times and report the median
+FAST_SECONDS = 0.01
+FAST_REPEAT = 25
+MIN_DELTA_MS = 0.5
+
+
+def measure(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    if min(times) < FAST_SECONDS:
+        while len(times) < max(repeat, FAST_REPEAT):
+            start = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - start)
+        seconds = float(np.median(times))
+    else:
+        seconds = min(times)
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds, peak
+
+
+# Generators that keep intermediate layers start every run cold
+CACHES = ("layer_cache", "distance_cache")
+
+
+def uncached(generator, fn):
+    caches = [getattr(generator, name) for name in CACHES if hasattr(generator, name)]
+    if not caches:
+        return fn
+
+    def run():
+        for cache in caches:
+            cache.clear()
+        return fn()
+    return run
+
+
+# Param changes served from those layers: kind and changed params
+WARM_CHANGES = {
+    "PerlinNoise": ("reweight", lambda p: dict(p, persistance=p["persistance"] * 0.5)),
+    "SimplexNoise": ("reweight", lambda p: dict(p, persistance=p["persistance"] * 0.5)),
+    "WorleyNoise": ("remode", lambda p: dict(p, mode="F2 - F1" if p["mode"] == "F1" else "F1")),
+}
+
+
+# Seeds per generate_batch case, timed against as many generate_field calls
+BATCH_SEEDS = 16
+
+
+def result(kind, name, params, size, seconds, peak, channels=1, variant=None, count=1):
+    return {
+        "key": f"{kind}|{name}|{canonical_params(params)}|{size}",
+        "kind": kind,
+        "name": name,
+        "variant": variant or {},
+        "params": params,
+        "size": size,
+        "seconds": seconds,
+        "pixels_per_sec": count * size * size / seconds if seconds > 0 else float("inf"),
+        "peak_bytes": peak,
+        "channels": channels,
+    }
+
+
+def bench_generators(sizes, seeds, repeat, tmp_dir):
+    for name in GENERATORS:
+        generator = GENERATORS[name]()
+        base = default_params(generator)
+        for variant in VARIANTS.get(name, [{}]):
+            for seed in (seeds if "seed" in base else [None]):
+                for size in sizes:
+                    params = dict(base, **variant, size=size)
+                    if seed is not None:
+                        params["seed"] = seed
+                    if size <= IN_MEMORY_MAX:
+                        fn = uncached(generator, lambda: generator.generate_field(params))
+                        kind = "generate"
+                    elif name in ("PerlinNoise", "SimplexNoise", "WorleyNoise", "WhiteNoise"):
+                        path = os.path.join(tmp_dir, "tiled.npy")
+                        fn = uncached(generator, lambda: render_tiled(generator, params, path))
+                        kind = "tiled"
+                    else:
+                        continue
+                    seconds, peak = measure(fn, 1 if size >= 2048 else repeat)
+                    label = dict(variant, seed=seed) if seed is not None else variant
+                    yield result(kind, name, params, size, seconds, peak, variant=label)
+
+                    if kind == "generate" and name in WARM_CHANGES:
+                        warm_kind, change = WARM_CHANGES[name]
+                        generator.generate_field(params)
+                        changed = change(params)
+                        seconds, peak = measure(lambda: generator.generate_field(changed), repeat)
+                        yield result(warm_kind, name, changed, size, seconds, peak, variant=label)
+
+                    if kind == "generate" and seed is not None and size <= 1024:
+                        batch = range(params["seed"], params["seed"] + BATCH_SEEDS)
+                        fn = uncached(generator, lambda: generator.generate_batch(params, batch))
+                        seconds, peak = measure(fn, repeat)
+                        yield result("batch", name, params, size, seconds, peak, variant=label, count=BATCH_SEEDS)
+
+
+def bench_modifiers(sizes, repeat):
+    rng = np.random.default_rng(0)
+    for size in [s for s in sizes if s <= IN_MEMORY_MAX]:
+        field = NoiseField(rng.random((size, size), dtype=np.float32))
+        image = field.to_rgb8()
+        for name in MODIFIERS:
+            modifier = MODIFIERS[name]()
+            stack = ModifierStack([(modifier, default_params(modifier))])
+            seconds, peak = measure(lambda: stack.apply_field(field), repeat)
+            yield result("modifier_field", name, {}, size, seconds, peak)
+            seconds, peak = measure(lambda: stack.apply(image), repeat)
+            yield result("modifier_rgb8", name, {}, size, seconds, peak, channels=3)
+
+
+def bench_display(sizes, repeat):
+    try:
+        from main import field_to_qimage
+    except ImportError:
+        return
+    rng = np.random.default_rng(0)
+    for size in [s for s in sizes if s <= IN_MEMORY_MAX]:
+        for channels in (1, 3):
+            shape = (size, size) if channels == 1 else (size, size, 3)
+            field = NoiseField(rng.random(shape, dtype=np.float32))
+            seconds, peak = measure(lambda: field_to_qimage(field), repeat)
+            yield result("qimage", f"field_to_qimage/{channels}ch", {}, size, seconds, peak, channels)
+
+
+def compare(results, baseline, threshold, min_delta=MIN_DELTA_MS / 1000):
+    old = {r["key"]: r for r in baseline["results"]}
+    regressions = []
+    for r in results:
+        if r["key"] in old:
+            before = old[r["key"]]["seconds"]
+            ratio = r["seconds"] / max(before, 1e-9)
+            r["baseline_ratio"] = ratio
+            # microsecond cases can double from noise alone
+            if ratio > 1.0 + threshold and r["seconds"] - before > min_delta:
+                regressions.append(r)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark generators, modifiers and display conversion")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--large", action="store_true", help=f"also run {LARGE_SIZES} out of core")
+    parser.add_argument("--seeds", type=int, nargs="+", default=[1])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", choices=["generators", "modifiers", "display"])
+    parser.add_argument("--out", help="write results as JSON")
+    parser.add_argument("--baseline", help="JSON from an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown, 0.25 = 25%%")
+    parser.add_argument("--min-delta-ms", type=float, default=MIN_DELTA_MS,
+                        help="slowdowns smaller than this are never regressions")
+    args = parser.parse_args(argv)
+
+    sizes = args.sizes + (LARGE_SIZES if args.large else [])
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        suites = {
+            "generators": lambda: bench_generators(sizes, args.seeds, args.repeat, tmp_dir),
+            "modifiers": lambda: bench_modifiers(sizes, args.repeat),
+            "display": lambda: bench_display(sizes, args.repeat),
+        }
+        for suite, run in suites.items():
+            if args.only and args.only != suite:
+                continue
+            for r in run():
+                results.append(r)
+                variant = " ".join(f"{k}={v}" for k, v in r["variant"].items())
+                print(f"{r['kind']:15} {r['name']:24} {variant:28} {r['size']:6} {r['seconds'] * 1000:10.2f} ms "
+                      f"{r['pixels_per_sec'] / 1e6:9.2f} Mpx/s {r['peak_bytes'] / 2**20:9.1f} MB")
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold, args.min_delta_ms / 1000)
+        for r in regressions:
+            print(f"REGRESSION {r['key']}: {r['baseline_ratio']:.2f}x slower", file=sys.stderr)
+
+    if args.out:
+        report = {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "results": results,
+        }
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=1)
+
+    return 1 if regressions else 0
+
+
+
+if __name__ == "__main__":
+    sys.exit(main())
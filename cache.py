@@ -0,0 +1,191 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from field import NoiseField
+
+# Rendered fields keyed by (generator name, params).
+# Entries live in memory up to max_bytes with least recently used ones
+# evicted first. With disk_dir set, every entry is also written there as a
+# compressed .npz, so results survive restarts and evicted entries can be
+# read back instead of rendered again.
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+DEFAULT_LAYER_BYTES = 256 * 1024 * 1024
+# LayerCache.reserve() grows the budget up to this, enough for every octave
+# of the largest UI render (4096 x 4096, 8 float64 octaves)
+MAX_LAYER_BYTES = 1024 * 1024 * 1024
+
+
+def canonical_params(params):
+    def canon(value):
+        if isinstance(value, dict):
+            return {str(k): canon(v) for k, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [canon(v) for v in value]
+        if isinstance(value, bool) or value is None or isinstance(value, str):
+            return value
+        # ints stay exact (seeds past 2**53 don't fit a float), floats with an
+        # integral value key like the int, so 1 and 1.0 share an entry
+        if isinstance(value, (int, np.integer)):
+            return int(value)
+        if isinstance(value, (float, np.floating)):
+            value = float(value)
+            return int(value) if value.is_integer() else value
+        return str(value)
+
+    return json.dumps(canon(params), sort_keys=True, separators=(",", ":"))
+
+
+class ResultCache:
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, disk_dir=None):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        # Render jobs run on worker threads
+        self._lock = threading.Lock()
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(name, params):
+        return name + "|" + canonical_params(params)
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, hashlib.sha1(key.encode()).hexdigest() + ".npz")
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def nbytes(self):
+        return self._bytes
+
+    def get(self, name, params):
+        key = self.make_key(name, params)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+
+        if self.disk_dir:
+            path = self._disk_path(key)
+            if os.path.exists(path):
+                field = NoiseField.load_npz(path)
+                self._store(key, field)
+                with self._lock:
+                    self.hits += 1
+                return field
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, name, params, field):
+        key = self.make_key(name, params)
+        field = self._store(key, field)
+        if self.disk_dir:
+            path = self._disk_path(key)
+            if not os.path.exists(path):
+                # write then rename, so readers never see a partial file
+                tmp = path + f".{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(tmp, "wb") as f:
+                    field.save_npz(f)
+                os.replace(tmp, path)
+        return field
+
+    def _store(self, key, field):
+        # Cached fields are shared between callers, so they are frozen
+        for data in [field.data] + (field.mipmaps or []):
+            data.flags.writeable = False
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key).nbytes
+            if field.nbytes > self.max_bytes:
+                return field
+            self._entries[key] = field
+            self._bytes += field.nbytes
+            while self._bytes > self.max_bytes:
+                _, old = self._entries.popitem(last=False)
+                self._bytes -= old.nbytes
+        return field
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+
+class LayerCache:
+    """
+    Intermediate arrays (e.g. single noise octaves) keyed by any hashable
+    key, least recently used first out once they take more than max_bytes.
+    Stored arrays are frozen since every caller gets the same object.
+    """
+    def __init__(self, max_bytes=DEFAULT_LAYER_BYTES, max_reserve=MAX_LAYER_BYTES):
+        self.max_bytes = max_bytes
+        self.default_bytes = max_bytes
+        self.max_reserve = max_reserve
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def nbytes(self):
+        return self._bytes
+
+    def get(self, key):
+        with self._lock:
+            array = self._entries.get(key)
+            if array is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return array
+
+    def put(self, key, array):
+        array.flags.writeable = False
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key).nbytes
+            if array.nbytes > self.max_bytes:
+                return array
+            self._entries[key] = array
+            self._bytes += array.nbytes
+            while self._bytes > self.max_bytes:
+                _, old = self._entries.popitem(last=False)
+                self._bytes -= old.nbytes
+        return array
+
+    def reserve(self, nbytes):
+        """
+        Budget for a working set of nbytes, e.g. every layer of the current
+        render: LRU eviction of layers read in order drops each one before it
+        is reused once they don't all fit. Never below the default budget or
+        above max_reserve, shrinking evicts as usual.
+        """
+        with self._lock:
+            self.max_bytes = max(self.default_bytes, min(nbytes, self.max_reserve))
+            while self._bytes > self.max_bytes:
+                _, old = self._entries.popitem(last=False)
+                self._bytes -= old.nbytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
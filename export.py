@@ -0,0 +1,227 @@
+import contextlib
+import json
+import os
+import struct
+import zipfile
+import zlib
+
+import numpy as np
+
+import profiling
+from field import NoiseField, downsample, mip_chain, mip_count
+from render import RenderCancelled
+
+# Streaming export of fields to disk.
+#
+# Sources are NoiseFields or float arrays in [0, 1] of shape (h, w) or
+# (h, w, 3), including the .npy memmaps of render_tiled. They are read
+# EXPORT_ROWS rows at a time, so exporting an out-of-core render never loads
+# it whole. Files are written next to the target and renamed when complete,
+# write_png and write_raw also take open binary file objects.
+#
+#   .png          8 or 16 bit grayscale/RGB, zlib level 0-9
+#   .npy          float32 (memmap friendly)
+#   .raw / .r16   16 bit little endian heightmap, no header
+#   .r32          float32 little endian heightmap, no header
+#   .npz          float32 mip chain, base and box filtered levels
+#   anything else 8 bit through PIL, in memory
+
+EXPORT_ROWS = 256
+DEFAULT_COMPRESS_LEVEL = 6
+FORMATS = {
+    ".png": "png",
+    ".npy": "npy",
+    ".raw": "raw16",
+    ".r16": "raw16",
+    ".r32": "raw32",
+    ".npz": "mips",
+}
+
+
+def _data(source):
+    return source.data if isinstance(source, NoiseField) else source
+
+
+def _bands(data, progress=None, cancelled=None, rows=EXPORT_ROWS):
+    height = data.shape[0]
+    for r0 in range(0, height, rows):
+        if cancelled is not None and cancelled():
+            raise RenderCancelled
+        yield np.clip(np.asarray(data[r0:r0 + rows], dtype=np.float32), 0.0, 1.0)
+        if progress is not None:
+            progress(min(r0 + rows, height), height)
+
+
+def _quantize(band, bit_depth, byteorder=">"):
+    if bit_depth == 16:
+        return (band * 65535).astype(byteorder + "u2")
+    return (band * 255).astype(np.uint8)
+
+
+def _open(path):
+    # file objects (e.g. BytesIO) are written as they are
+    if hasattr(path, "write"):
+        return contextlib.nullcontext(path)
+    return _PartFile(path)
+
+
+class _PartFile:
+    """Opened as path + '.part', renamed to path on success and removed on errors."""
+    def __init__(self, path):
+        self.path = path
+        self.part = path + ".part"
+
+    def __enter__(self):
+        self.file = open(self.part, "wb")
+        return self.file
+
+    def __exit__(self, exc_type, *exc):
+        self.file.close()
+        if exc_type is None:
+            os.replace(self.part, self.path)
+        elif os.path.exists(self.part):
+            os.remove(self.part)
+        return False
+
+
+def _png_chunk(f, tag, data):
+    f.write(struct.pack(">I", len(data)))
+    f.write(tag)
+    f.write(data)
+    f.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(tag)) & 0xFFFFFFFF))
+
+
+def write_png(source, path, bit_depth=8, compress_level=DEFAULT_COMPRESS_LEVEL, progress=None, cancelled=None):
+    data = _data(source)
+    height, width = data.shape[:2]
+    channels = 1 if data.ndim == 2 else data.shape[2]
+    if channels not in (1, 3):
+        raise ValueError(f"PNG export needs 1 or 3 channels, got {channels}")
+    if bit_depth not in (8, 16):
+        raise ValueError(f"PNG bit depth must be 8 or 16, got {bit_depth}")
+
+    # bytes per pixel, the distance the Sub filter looks back
+    bpp = channels * bit_depth // 8
+    compressor = zlib.compressobj(compress_level)
+    with profiling.stage("export", pixels=height * width) as s, _open(path) as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        color_type = 0 if channels == 1 else 2
+        _png_chunk(f, b"IHDR", struct.pack(">IIBBBBB", width, height, bit_depth, color_type, 0, 0, 0))
+
+        for band in _bands(data, progress, cancelled):
+            raw = _quantize(band, bit_depth).reshape(len(band), -1).view(np.uint8)
+            # every row starts with its filter type, 1 = Sub (difference to
+            # the pixel on the left), which compresses smooth noise far better
+            rows = np.empty((raw.shape[0], raw.shape[1] + 1), dtype=np.uint8)
+            rows[:, 0] = 1
+            rows[:, 1:bpp + 1] = raw[:, :bpp]
+            np.subtract(raw[:, bpp:], raw[:, :-bpp], out=rows[:, bpp + 1:])
+            chunk = compressor.compress(rows.tobytes())
+            if chunk:
+                _png_chunk(f, b"IDAT", chunk)
+        _png_chunk(f, b"IDAT", compressor.flush())
+        _png_chunk(f, b"IEND", b"")
+        s.nbytes = f.tell()
+
+
+def write_npy(source, path, dtype=np.float32, progress=None, cancelled=None):
+    data = _data(source)
+    part = path + ".part"
+    try:
+        with profiling.stage("export", pixels=data.shape[0] * data.shape[1]) as s:
+            out = np.lib.format.open_memmap(part, mode="w+", dtype=dtype, shape=data.shape)
+            r0 = 0
+            for band in _bands(data, progress, cancelled):
+                out[r0:r0 + len(band)] = band
+                r0 += len(band)
+            out.flush()
+            s.nbytes = out.nbytes
+            del out
+        os.replace(part, path)
+    except BaseException:
+        if os.path.exists(part):
+            os.remove(part)
+        raise
+
+
+def write_raw(source, path, bit_depth=16, progress=None, cancelled=None):
+    """Headerless little endian heightmap, 16 bit unsigned or 32 bit float. Color is averaged."""
+    data = _data(source)
+    if bit_depth not in (16, 32):
+        raise ValueError(f"RAW bit depth must be 16 or 32, got {bit_depth}")
+    with profiling.stage("export", pixels=data.shape[0] * data.shape[1]) as s, _open(path) as f:
+        for band in _bands(data, progress, cancelled):
+            if band.ndim == 3:
+                band = band.mean(axis=-1)
+            if bit_depth == 16:
+                f.write(_quantize(band, 16, "<").tobytes())
+            else:
+                f.write(band.astype("<f4").tobytes())
+        s.nbytes = f.tell()
+
+
+def write_mips(source, path, levels=None, compress_level=0, progress=None, cancelled=None):
+    """
+    Mip chain (see field.mip_chain) in one .npz: "data" is the base level,
+    so NoiseField.load_npz still reads it, then "mip1", "mip2", ... and
+    "meta". The base is streamed in bands and reduced on the way, only the
+    smaller levels are held in memory, unless source already carries them
+    (generate_field(mips=True)). compress_level 0 stores the arrays.
+    """
+    data = _data(source)
+    levels = mip_count(data.shape) if levels is None else min(levels, mip_count(data.shape))
+    attached = getattr(source, "mipmaps", None)
+    if attached is not None and len(attached) < levels - 1:
+        attached = None
+    meta = source.meta() if isinstance(source, NoiseField) else {"generator": None, "params": {}, "value_range": None}
+    compression = zipfile.ZIP_DEFLATED if compress_level else zipfile.ZIP_STORED
+
+    with profiling.stage("export", pixels=data.shape[0] * data.shape[1]) as s, _open(path) as f:
+        with zipfile.ZipFile(f, "w", compression, compresslevel=compress_level or None) as archive:
+            with archive.open("data.npy", "w", force_zip64=True) as entry:
+                header = {"descr": np.lib.format.dtype_to_descr(np.dtype("<f4")), "fortran_order": False,
+                          "shape": data.shape}
+                np.lib.format.write_array_header_1_0(entry, header)
+                # EXPORT_ROWS is even, so reduced bands line up
+                reduced = []
+                for band in _bands(data, progress, cancelled):
+                    entry.write(band.astype("<f4", copy=False).tobytes())
+                    if levels > 1 and attached is None:
+                        reduced.append(downsample(band))
+
+            if levels > 1:
+                if attached is None:
+                    attached = mip_chain(np.concatenate(reduced), levels - 1)
+                for i, level in enumerate(attached[:levels - 1], 1):
+                    with archive.open(f"mip{i}.npy", "w", force_zip64=True) as entry:
+                        np.lib.format.write_array(entry, level)
+            with archive.open("meta.npy", "w") as entry:
+                np.lib.format.write_array(entry, np.array(json.dumps(meta, default=str)))
+        s.nbytes = f.tell()
+
+
+def export(source, path, bit_depth=None, compress_level=DEFAULT_COMPRESS_LEVEL, progress=None, cancelled=None,
+           mip_levels=None):
+    """
+    Write source to path, the format follows the extension (see FORMATS).
+    bit_depth is 8 or 16 for PNG (default 8) and 16 or 32 for RAW (default
+    by extension), mip_levels limits the levels of a .npz chain.
+    progress(done_rows, total_rows) is called after every band,
+    RenderCancelled is raised once cancelled() returns True and no file is
+    left behind.
+    """
+    fmt = FORMATS.get(os.path.splitext(path)[1].lower())
+    if fmt == "mips":
+        write_mips(source, path, mip_levels, compress_level, progress, cancelled)
+    elif fmt == "png":
+        write_png(source, path, bit_depth or 8, compress_level, progress, cancelled)
+    elif fmt == "npy":
+        write_npy(source, path, progress=progress, cancelled=cancelled)
+    elif fmt in ("raw16", "raw32"):
+        write_raw(source, path, bit_depth or (16 if fmt == "raw16" else 32), progress, cancelled)
+    else:
+        from PIL import Image
+
+        field = source if isinstance(source, NoiseField) else NoiseField(np.asarray(source))
+        image = field.to_gray8() if field.channels == 1 else field.to_rgb8()
+        Image.fromarray(image).save(path)
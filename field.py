@@ -0,0 +1,134 @@
+import json
+
+import numpy as np
+
+import profiling
+
+
+# Raw generator output to field values. Normalized generators are rescaled
+# by their own min/max, others already produce values in [0, 1].
+def normalize(noise_data: np.ndarray, normalized: bool = True, dtype=np.float32):
+    with profiling.stage("normalize", pixels=noise_data.size) as s:
+        data_min = float(noise_data.min())
+        data_max = float(noise_data.max())
+        if normalized and data_max > data_min:
+            noise_data = (noise_data - data_min) / (data_max - data_min)
+        data = noise_data.astype(dtype, copy=False)
+        s.nbytes = data.nbytes
+    return data, (data_min, data_max)
+
+
+
+# Mip levels: every level halves the one above with a 2x2 box filter, odd
+# sizes repeat their last row/column. The float values are averaged, so
+# levels don't pick up the rounding of an 8 or 16 bit export.
+def downsample(data: np.ndarray) -> np.ndarray:
+    h, w = data.shape[:2]
+    if h % 2 or w % 2:
+        data = np.pad(data, [(0, h % 2), (0, w % 2)] + [(0, 0)] * (data.ndim - 2), mode="edge")
+    out = data[0::2, 0::2].astype(np.float32)
+    out += data[1::2, 0::2]
+    out += data[0::2, 1::2]
+    out += data[1::2, 1::2]
+    out *= np.float32(0.25)
+    return out
+
+
+def mip_count(shape) -> int:
+    """Levels of a full chain down to 1x1, the base included."""
+    return (max(shape[:2]) - 1).bit_length() + 1
+
+
+def mip_chain(data: np.ndarray, levels: int = None) -> list:
+    """[data, data / 2, data / 4, ...], levels long (default: down to 1x1)."""
+    levels = mip_count(data.shape) if levels is None else min(levels, mip_count(data.shape))
+    chain = [data]
+    with profiling.stage("mips", pixels=data.shape[0] * data.shape[1]):
+        for _ in range(levels - 1):
+            chain.append(downsample(chain[-1]))
+    return chain
+
+
+
+class NoiseField:
+    """
+    Generator output kept at full precision: float32 values in [0, 1] with
+    shape (h, w) for grayscale or (h, w, 3) for color. Expanding to RGB
+    uint8 is left to display and export.
+    """
+    def __init__(self, data: np.ndarray, generator: str = None, params: dict = None, value_range=None):
+        self.data = data
+        self.generator = generator
+        self.params = dict(params) if params else {}
+        # raw min/max before normalization
+        self.value_range = value_range
+        # lower mip levels (half size first) from generate_field(mips=True),
+        # with_data() builds them again for the new data
+        self.mipmaps = None
+
+    @classmethod
+    def from_rgb8(cls, image: np.ndarray, **meta):
+        return cls(image.astype(np.float32) * np.float32(1.0 / 255.0), **meta)
+
+    @property
+    def shape(self):
+        return self.data.shape[:2]
+
+    @property
+    def channels(self):
+        return 1 if self.data.ndim == 2 else self.data.shape[2]
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes + sum(level.nbytes for level in self.mipmaps or ())
+
+    def with_data(self, data):
+        field = NoiseField(data, self.generator, self.params, self.value_range)
+        if self.mipmaps is not None:
+            field.mipmaps = mip_chain(data, len(self.mipmaps) + 1)[1:]
+        return field
+
+    def to_gray8(self) -> np.ndarray:
+        with profiling.stage("gray8", pixels=self.data.size, nbytes=self.data.size):
+            data = self.data if self.channels == 1 else self.data.mean(axis=-1)
+            return (np.clip(data, 0.0, 1.0) * 255).astype(np.uint8)
+
+    def to_rgb8(self) -> np.ndarray:
+        with profiling.stage("rgb_stack", pixels=self.data.size, nbytes=self.shape[0] * self.shape[1] * 3):
+            u8 = (np.clip(self.data, 0.0, 1.0) * 255).astype(np.uint8)
+            if u8.ndim == 3:
+                return u8
+            return np.stack((u8, u8, u8), axis=-1)
+
+    def meta(self) -> dict:
+        return {"generator": self.generator, "params": self.params, "value_range": self.value_range}
+
+    def save_npz(self, file, compressed=True):
+        save = np.savez_compressed if compressed else np.savez
+        save(file, data=self.data, meta=np.array(json.dumps(self.meta(), default=str)))
+
+    def mips(self, levels: int = None) -> list:
+        """[self, half size, ...] down to 1x1 or levels long, attached levels are reused."""
+        levels = mip_count(self.data.shape) if levels is None else min(levels, mip_count(self.data.shape))
+        lower = self.mipmaps
+        if lower is None or len(lower) < levels - 1:
+            lower = mip_chain(self.data, levels)[1:]
+        return [self] + [NoiseField(data, self.generator, self.params, self.value_range)
+                         for data in lower[:levels - 1]]
+
+    @classmethod
+    def load_npz(cls, file):
+        with np.load(file) as f:
+            meta = json.loads(str(f["meta"]))
+            data = f["data"]
+        value_range = tuple(meta["value_range"]) if meta["value_range"] else None
+        return cls(data, meta["generator"], meta["params"], value_range)
+
+    @classmethod
+    def load_mips(cls, file) -> list:
+        """Levels of a chain written by export.write_mips, base first."""
+        with np.load(file) as f:
+            meta = json.loads(str(f["meta"]))
+            levels = [f["data"]] + [f[f"mip{i}"] for i in range(1, len(f.files) - 1)]
+        value_range = tuple(meta["value_range"]) if meta["value_range"] else None
+        return [cls(data, meta["generator"], meta["params"], value_range) for data in levels]
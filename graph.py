@@ -0,0 +1,221 @@
+import hashlib
+import json
+
+import numpy as np
+
+import profiling
+from cache import ResultCache, canonical_params
+from field import NoiseField
+from modifiers import ModifierStack
+from registry import GENERATORS, MODIFIERS, Instances, default_params
+
+# Texture composition as a DAG of named nodes:
+#
+#   source    a generator from registry.GENERATORS with its params
+#   blend     two inputs (a, b) combined by op, optional third input as mask
+#   modifier  one input through a modifier from registry.MODIFIERS
+#
+# Graph.evaluate(name) only evaluates what the node depends on. Every node
+# has a content hash over its own settings and the hashes of its inputs,
+# results are kept in a ResultCache under that hash, so after editing one
+# node only the nodes downstream of it are evaluated again. Source nodes use
+# the same (generator, params) keys as the GUI and noisegen.
+#
+# Graphs round trip through JSON (to_dict/from_dict, save/load):
+#
+#   {"size": 512, "output": "out", "nodes": {
+#       "clouds": {"type": "source", "generator": "PerlinNoise", "params": {"seed": 3}},
+#       "cells":  {"type": "source", "generator": "WorleyNoise", "params": {"mode": "F2 - F1"}},
+#       "masked": {"type": "blend", "op": "multiply", "inputs": ["clouds", "cells"]},
+#       "out":    {"type": "modifier", "modifier": "PowerOfX", "params": {"value": 1.5}, "inputs": ["masked"]}}}
+
+NODE_TYPES = ("source", "blend", "modifier")
+
+# a, b -> result, all float32 in [0, 1]
+BLEND_OPS = {
+    "normal": lambda a, b: b,
+    "add": lambda a, b: a + b,
+    "subtract": lambda a, b: a - b,
+    "multiply": lambda a, b: a * b,
+    "screen": lambda a, b: 1.0 - (1.0 - a) * (1.0 - b),
+    "difference": lambda a, b: np.abs(a - b),
+    "min": np.minimum,
+    "max": np.maximum,
+}
+
+
+class GraphError(Exception):
+    pass
+
+
+
+class Node:
+    def __init__(self, type, inputs=(), params=None, generator=None, modifier=None, op=None):
+        if type not in NODE_TYPES:
+            raise GraphError(f"Unknown node type '{type}', expected one of {NODE_TYPES}")
+        self.type = type
+        self.inputs = list(inputs)
+        self.params = dict(params or {})
+        self.generator = generator
+        self.modifier = modifier
+        self.op = op
+
+    def settings(self) -> dict:
+        return {"type": self.type, "generator": self.generator, "modifier": self.modifier,
+                "op": self.op, "params": self.params}
+
+    def to_dict(self) -> dict:
+        data = {k: v for k, v in self.settings().items() if v is not None}
+        if self.inputs:
+            data["inputs"] = self.inputs
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["type"], data.get("inputs", ()), data.get("params"),
+                   data.get("generator"), data.get("modifier"), data.get("op"))
+
+
+
+class Graph:
+    def __init__(self, nodes=None, output=None, size=None, cache=None):
+        self.nodes = dict(nodes or {})
+        self.output = output
+        # default size for sources that don't set one
+        self.size = size
+        self.cache = cache if cache is not None else ResultCache()
+        self._generators = Instances(GENERATORS)
+        self._modifiers = Instances(MODIFIERS)
+
+    # Building
+
+    def add(self, name, node):
+        self.nodes[name] = node
+        return name
+
+    def add_source(self, name, generator, params=None):
+        return self.add(name, Node("source", params=params, generator=generator))
+
+    def add_blend(self, name, op, a, b, mask=None, opacity=1.0):
+        inputs = [a, b] + ([mask] if mask else [])
+        return self.add(name, Node("blend", inputs, {"opacity": opacity}, op=op))
+
+    def add_modifier(self, name, modifier, source, params=None):
+        return self.add(name, Node("modifier", [source], params, modifier=modifier))
+
+    def set_params(self, name, **params):
+        self.nodes[name].params.update(params)
+
+    # Evaluation
+
+    def _generator(self, name):
+        if name not in GENERATORS:
+            raise GraphError(f"Unknown generator '{name}', expected one of {list(GENERATORS)}")
+        return self._generators[name]
+
+    def _modifier(self, name):
+        if name not in MODIFIERS:
+            raise GraphError(f"Unknown modifier '{name}', expected one of {list(MODIFIERS)}")
+        return self._modifiers[name]
+
+    def _full_params(self, node):
+        instance = self._generator(node.generator) if node.type == "source" else self._modifier(node.modifier)
+        params = default_params(instance)
+        if node.type == "source" and self.size is not None:
+            params["size"] = self.size
+        params.update(node.params)
+        return params
+
+    def node_hash(self, name, _memo=None, _path=()):
+        memo = {} if _memo is None else _memo
+        if name in memo:
+            return memo[name]
+        if name in _path:
+            raise GraphError(f"Cycle through node '{name}'")
+        if name not in self.nodes:
+            raise GraphError(f"Unknown node '{name}'")
+        node = self.nodes[name]
+        settings = node.settings()
+        if node.type != "blend":
+            settings["params"] = self._full_params(node)
+        settings["inputs"] = [self.node_hash(i, memo, _path + (name,)) for i in node.inputs]
+        memo[name] = hashlib.sha1(canonical_params(settings).encode()).hexdigest()
+        return memo[name]
+
+    def evaluate(self, name=None) -> NoiseField:
+        """Field of node name (default: the output node), evaluating only what it depends on."""
+        name = name or self.output
+        if name is None:
+            raise GraphError("No node given and the graph has no output")
+        hashes = {}
+        self.node_hash(name, hashes)
+        return self._evaluate(name, hashes, {})
+
+    def _evaluate(self, name, hashes, done):
+        if name in done:
+            return done[name]
+        node = self.nodes[name]
+
+        if node.type == "source":
+            params = self._full_params(node)
+            field = self.cache.get(node.generator, params)
+            if field is None:
+                field = self.cache.put(node.generator, params, self._generator(node.generator).generate_field(params))
+        else:
+            field = self.cache.get("graph", {"node": hashes[name]})
+            if field is None:
+                inputs = [self._evaluate(i, hashes, done) for i in node.inputs]
+                field = self.cache.put("graph", {"node": hashes[name]}, self._compute(node, inputs))
+
+        done[name] = field
+        return field
+
+    def _compute(self, node, inputs):
+        if node.type == "modifier":
+            if len(inputs) != 1:
+                raise GraphError("Modifier nodes take exactly one input")
+            modifier = self._modifier(node.modifier)
+            return ModifierStack([(modifier, self._full_params(node))]).apply_field(inputs[0])
+
+        if node.op not in BLEND_OPS:
+            raise GraphError(f"Unknown blend op '{node.op}', expected one of {list(BLEND_OPS)}")
+        if len(inputs) not in (2, 3):
+            raise GraphError("Blend nodes take two inputs and an optional mask")
+        if len({f.shape for f in inputs}) != 1:
+            raise GraphError(f"Blend inputs differ in size: {[f.shape for f in inputs]}")
+
+        with profiling.stage("blend", pixels=inputs[0].data.size) as s:
+            # grayscale inputs broadcast against color ones
+            channels = max(f.channels for f in inputs)
+            a, b, *mask = [f.data[..., None] if channels > 1 and f.channels == 1 else f.data for f in inputs]
+            result = BLEND_OPS[node.op](a, b)
+            opacity = np.float32(node.params.get("opacity", 1.0))
+            if mask or opacity != 1.0:
+                weight = mask[0] * opacity if mask else opacity
+                result = a + (result - a) * weight
+            # inputs are cached and read-only, clip always makes a new array
+            result = np.clip(result, 0.0, 1.0).astype(np.float32, copy=False)
+            s.nbytes = result.nbytes
+        return NoiseField(result, "graph", {"op": node.op, **node.params})
+
+    # Serialization
+
+    def to_dict(self) -> dict:
+        data = {"output": self.output, "nodes": {name: node.to_dict() for name, node in self.nodes.items()}}
+        if self.size is not None:
+            data["size"] = self.size
+        return data
+
+    @classmethod
+    def from_dict(cls, data, cache=None):
+        nodes = {name: Node.from_dict(node) for name, node in data["nodes"].items()}
+        return cls(nodes, data.get("output"), data.get("size"), cache)
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=1)
+
+    @classmethod
+    def load(cls, path, cache=None):
+        with open(path) as f:
+            return cls.from_dict(json.load(f), cache)
@@ -1,15 +1,24 @@
+import os
 import sys
+from collections import OrderedDict
 import numpy as np
 
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
     QLabel, QComboBox, QPushButton, QSlider, QFormLayout, QColorDialog,
-    QLineEdit, QGroupBox, QMessageBox, QSpinBox, QDoubleSpinBox, QFrame, QCheckBox
+    QLineEdit, QGroupBox, QMessageBox, QSpinBox, QDoubleSpinBox, QFrame, QCheckBox,
+    QProgressBar
 )
 from PyQt6.QtGui import QPixmap, QColor, QImage
-from PyQt6.QtCore import Qt
+from PyQt6.QtCore import Qt, QObject, QRunnable, QThreadPool, pyqtSignal
 
 from registry import GENERATORS, MODIFIERS
+from cache import ResultCache
+from modifiers import ModifierStack
+import profiling
+from render import render_bands, render_progressive, RenderCancelled
+from viewport import Viewport
+from export import export, DEFAULT_COMPRESS_LEVEL
 
 ################
 #
@@ -21,21 +30,119 @@ from registry import GENERATORS, MODIFIERS
 #
 ################
 
+# Scaled pixmaps kept per zoom step of the current image
+PIXMAP_CACHE_SIZE = 32
+
+# Save dialog filter -> (bit depth, default extension), see export.py
+EXPORT_FILTERS = {
+    "PNG 8-bit (*.png)": (8, ".png"),
+    "PNG 16-bit (*.png)": (16, ".png"),
+    "NumPy float32 (*.npy)": (None, ".npy"),
+    "RAW 16-bit heightmap (*.r16 *.raw)": (16, ".r16"),
+    "RAW float32 heightmap (*.r32)": (32, ".r32"),
+    "Mip chain float32 (*.npz)": (None, ".npz"),
+}
+
+
+def field_to_qimage(field):
+    """
+    QImage over a uint8 copy of the field, without further copies.
+    Returns (qimage, buffer), the buffer has to outlive the image.
+    Single channel fields use Grayscale8, colored ones RGB888, the same
+    values an 8-bit PNG export gets.
+    """
+    with profiling.stage("qimage", pixels=field.shape[0] * field.shape[1]) as s:
+        if field.channels == 1:
+            buffer = np.ascontiguousarray(field.to_gray8())
+            fmt = QImage.Format.Format_Grayscale8
+        else:
+            buffer = np.ascontiguousarray(field.to_rgb8())
+            fmt = QImage.Format.Format_RGB888
+        s.nbytes = buffer.nbytes
+        h, w = buffer.shape[:2]
+        return QImage(buffer.data, w, h, buffer.strides[0], fmt), buffer
+
+
+
+# Reports drags, wheel steps and resizes for the pan/zoom canvas
 class ImageLabel(QLabel):
+    dragged = pyqtSignal(float, float)          # dx, dy in screen pixels
+    zoomed = pyqtSignal(float, float, float)    # wheel steps, x, y
+    resized = pyqtSignal()
+
     def __init__(self):
         super().__init__()
-
-        pass
+        self.last_pos = None
 
     def mousePressEvent(self, ev):
+        if ev.button() == Qt.MouseButton.LeftButton:
+            self.last_pos = ev.position()
         return super().mousePressEvent(ev)
     
     def mouseMoveEvent(self, ev):
+        if self.last_pos is not None and ev.buttons() & Qt.MouseButton.LeftButton:
+            pos = ev.position()
+            self.dragged.emit(pos.x() - self.last_pos.x(), pos.y() - self.last_pos.y())
+            self.last_pos = pos
         return super().mouseMoveEvent(ev)
+
+    def mouseReleaseEvent(self, ev):
+        self.last_pos = None
+        return super().mouseReleaseEvent(ev)
     
     def dragMoveEvent(self, a0):
         return super().dragMoveEvent(a0)
 
+    def wheelEvent(self, ev):
+        pos = ev.position()
+        self.zoomed.emit(ev.angleDelta().y() / 120, pos.x(), pos.y())
+
+    def resizeEvent(self, ev):
+        self.resized.emit()
+        return super().resizeEvent(ev)
+
+
+
+class RenderSignals(QObject):
+    progress = pyqtSignal(int, int, int)    # job id, done, total
+    partial = pyqtSignal(int, object)       # job id, intermediate result
+    finished = pyqtSignal(int, object)      # job id, result
+    failed = pyqtSignal(int, str)           # job id, message
+    done = pyqtSignal(int)                  # job id, always last
+
+
+
+# Runs fn(task) on the thread pool. fn should check task.cancelled between
+# chunks of work and report through task.report_progress.
+class RenderTask(QRunnable):
+    def __init__(self, job_id, fn):
+        super().__init__()
+        self.job_id = job_id
+        self.fn = fn
+        self.cancelled = False
+        self.signals = RenderSignals()
+
+    def cancel(self):
+        self.cancelled = True
+
+    def report_progress(self, done, total):
+        self.signals.progress.emit(self.job_id, done, total)
+
+    def report_partial(self, result):
+        self.signals.partial.emit(self.job_id, result)
+
+    def run(self):
+        try:
+            result = self.fn(self)
+            if not self.cancelled:
+                self.signals.finished.emit(self.job_id, result)
+        except RenderCancelled:
+            pass
+        except Exception as e:
+            self.signals.failed.emit(self.job_id, str(e))
+        finally:
+            self.signals.done.emit(self.job_id)
+
 
 
 class NoiseGenApp(QMainWindow):
@@ -45,7 +152,32 @@ class NoiseGenApp(QMainWindow):
         self.setGeometry(100, 100, 1280, 720)
         self.scale_percent = 100
         self.current_qimage = None
-        self.last_gen_instance = None
+        self.display_buffer = None
+        self.display_size = None
+        self.mips = []
+        self.pixmap_cache = OrderedDict()
+        self.field = None
+
+        # Pan/zoom canvas, see viewport.py. Active after Generate with Explore on.
+        self.viewport = Viewport()
+        self.exploring = False
+
+        # Rendered images by (generator, params), set NOISEGEN_CACHE_DIR to
+        # keep them on disk between runs
+        self.result_cache = ResultCache(disk_dir=os.environ.get("NOISEGEN_CACHE_DIR"))
+
+        # Renders run on the pool, only the newest job may update the view
+        self.thread_pool = QThreadPool()
+        self.job_id = 0
+        self.current_task = None
+        self.tasks = {}
+        # Exports run next to renders and are never cancelled by them
+        self.export_id = 0
+        self.exports = {}
+
+        # Stage timings of the last render go to the status bar
+        profiling.enable()
+        self.profile_mark = profiling.mark()
 
         self.generator_classes = GENERATORS
         self.modifier_classes = MODIFIERS
@@ -61,7 +193,10 @@ class NoiseGenApp(QMainWindow):
         main_layout = QHBoxLayout(central_widget)
 
         # Left panel (view)
-        self.image_label = QLabel()
+        self.image_label = ImageLabel()
+        self.image_label.dragged.connect(self.on_canvas_dragged)
+        self.image_label.zoomed.connect(self.on_canvas_zoomed)
+        self.image_label.resized.connect(self.update_canvas)
         self.image_label.setMinimumSize(256, 256)
         self.image_label.setMaximumSize(1024, 1024)
         self.image_label.setStyleSheet("background-color: #1f1f1f; border: 1px solid #ccc;")
@@ -72,6 +207,7 @@ class NoiseGenApp(QMainWindow):
         self.scale_slider.setRange(10, 400)
         self.scale_slider.setValue(100)
         self.scale_slider.valueChanged.connect(self.on_slider_changed)
+        self.scale_slider.sliderReleased.connect(self.update_view)
 
         self.scale_edit = QLineEdit("100")
         self.scale_edit.setFixedWidth(60)
@@ -122,9 +258,23 @@ class NoiseGenApp(QMainWindow):
         self.btn_modify.clicked.connect(self.apply_modifier)
         self.btn_save.clicked.connect(self.save_image)
 
+        self.compress_spin = QSpinBox()
+        self.compress_spin.setRange(0, 9)
+        self.compress_spin.setValue(DEFAULT_COMPRESS_LEVEL)
+        self.compress_spin.setPrefix("zlib ")
+        self.compress_spin.setToolTip("PNG compression level, 0 is fastest, 9 smallest")
+
+        self.progressive_check = QCheckBox("Progressive preview")
+        self.progressive_check.setChecked(True)
+        self.explore_check = QCheckBox("Explore")
+        self.explore_check.setToolTip("Pan and zoom the noise, only the visible pixels are evaluated")
+
         btn_layout = QHBoxLayout()
+        btn_layout.addWidget(self.progressive_check)
+        btn_layout.addWidget(self.explore_check)
         btn_layout.addWidget(self.btn_generate)
         btn_layout.addWidget(self.btn_modify)
+        btn_layout.addWidget(self.compress_spin)
         btn_layout.addWidget(self.btn_save)
 
         right_layout.addWidget(gen_group)
@@ -140,11 +290,17 @@ class NoiseGenApp(QMainWindow):
         main_layout.addLayout(left_layout, 3)
         main_layout.addLayout(right_layout, 2)
 
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setMaximumWidth(200)
+        self.progress_bar.hide()
+        self.statusBar().addPermanentWidget(self.progress_bar)
+
         # Update parameters
         self.on_generator_changed(self.gen_combo.currentText())
         self.on_modifier_changed(self.mod_combo.currentText())
 
     def on_generator_changed(self, name):
+        self.cancel_render()
         cls = self.generator_classes[name]
         instance = cls()
         schema = instance.get_ui_schema()
@@ -198,6 +354,16 @@ class NoiseGenApp(QMainWindow):
 
             layout.addRow(f"{label}:", w)
             widget_store[param_name] = w
+            if widget_store is self.generator_param_widgets:
+                self.connect_param_changed(w)
+
+    # Any generator parameter edit makes the render in flight stale.
+    # Modifiers only apply to its result, editing them keeps it running.
+    def connect_param_changed(self, widget):
+        for signal in ("valueChanged", "toggled", "currentTextChanged", "textChanged"):
+            if hasattr(widget, signal):
+                getattr(widget, signal).connect(self.cancel_render)
+                return
 
     def pick_color(self, button, store, param_name):
         color = QColorDialog.getColor(button.selected_color, self, "Color")
@@ -205,6 +371,8 @@ class NoiseGenApp(QMainWindow):
             button.selected_color = color
             store[param_name + "_color"] = color
             button.setStyleSheet(f"background-color: {color.name()};")
+            if store is self.generator_param_widgets:
+                self.cancel_render()
 
     def collect_params(self, widget_store):
         params = {}
@@ -227,42 +395,232 @@ class NoiseGenApp(QMainWindow):
                     params[name] = widget.text()
         return params
 
+    def start_task(self, fn, on_finished, on_partial=None):
+        self.cancel_render()
+        self.job_id += 1
+        task = RenderTask(self.job_id, fn)
+        task.signals.progress.connect(self.on_render_progress)
+        if on_partial is not None:
+            task.signals.partial.connect(on_partial)
+        task.signals.finished.connect(on_finished)
+        task.signals.failed.connect(self.on_render_failed)
+        task.signals.done.connect(self.on_render_done)
+        self.tasks[task.job_id] = task
+        self.current_task = task
+        self.profile_mark = profiling.mark()
+
+        self.progress_bar.setValue(0)
+        self.progress_bar.show()
+        self.thread_pool.start(task)
+
+    # Results of cancelled or superseded jobs are dropped
+    def is_current(self, job_id):
+        return self.current_task is not None and job_id == self.current_task.job_id
+
+    def cancel_render(self, *args):
+        if self.current_task is not None:
+            self.current_task.cancel()
+            self.current_task = None
+            self.progress_bar.hide()
+
+    def on_render_progress(self, job_id, done, total):
+        if self.is_current(job_id):
+            self.progress_bar.setMaximum(total)
+            self.progress_bar.setValue(done)
+
+    def on_render_failed(self, job_id, message):
+        if self.is_current(job_id):
+            QMessageBox.warning(self, "Error", message)
+
+    def on_render_done(self, job_id):
+        self.tasks.pop(job_id, None)
+        if job_id == self.job_id:
+            self.current_task = None
+            self.progress_bar.hide()
+
     def generate_image(self):
         gen_name = self.gen_combo.currentText()
         gen_cls = self.generator_classes[gen_name]
         gen_params = self.collect_params(self.generator_param_widgets)
-        if(self.last_gen_instance is None or not isinstance(self.last_gen_instance, type(gen_cls))):
-            self.last_gen_instance = gen_cls()
-        self.np_img = self.last_gen_instance.generate(gen_params)
 
-        # ndarray to QImage
-        h, w = self.np_img.shape[:2]
-        self.current_qimage = QImage(self.np_img.data.tobytes(), w, h, 3 * w, QImage.Format.Format_RGB888).copy()
-        self.update_view()
+        self.exploring = False
+        if self.explore_check.isChecked():
+            self.explore(gen_name, gen_cls(), gen_params)
+            return
+
+        progressive = self.progressive_check.isChecked()
+        self.render_size = gen_params.get("size")
+
+        # New instance per job, a cancelled job may still be running on the old one
+        def job(task):
+            field = self.result_cache.get(gen_name, gen_params)
+            if field is not None:
+                return field
+
+            instance = gen_cls()
+            cancelled = lambda: task.cancelled
+            if not progressive:
+                field = render_bands(instance, gen_params, progress=task.report_progress, cancelled=cancelled)
+            else:
+                for stride, field in render_progressive(instance, gen_params, progress=task.report_progress,
+                                                        cancelled=cancelled):
+                    if stride > 1:
+                        task.report_partial(field)
+            return self.result_cache.put(gen_name, gen_params, field)
+
+        self.start_task(job, self.on_generate_finished, self.on_generate_partial)
+
+    def on_generate_partial(self, job_id, field):
+        if not self.is_current(job_id):
+            return
+        # Coarse level of the same field, drawn at the final size
+        size = int(self.render_size)
+        self.set_display(field, (size, size))
+
+    def on_generate_finished(self, job_id, result):
+        if not self.is_current(job_id):
+            return
+        self.field = result
+        self.show_field()
+
+    # The canvas evaluates on the GUI thread, one screen of tiles at most
+    def explore(self, gen_name, generator, gen_params):
+        self.cancel_render()
+        try:
+            self.viewport.set_source(gen_name, generator, gen_params)
+        except ValueError as e:
+            QMessageBox.warning(self, "Error", str(e))
+            return
+        self.viewport.modifiers = None
+        if not self.exploring:
+            size = gen_params.get("size", 0)
+            self.viewport.center_on(size / 2, size / 2)
+            self.viewport.set_zoom(self.scale_percent / 100)
+        self.exploring = True
+        self.update_canvas()
+
+    def update_canvas(self):
+        if not self.exploring:
+            return
+        rect = self.image_label.contentsRect()
+        self.profile_mark = profiling.mark()
+        field = self.viewport.render(max(1, rect.width()), max(1, rect.height()))
+        self.current_qimage, self.display_buffer = field_to_qimage(field)
+        self.field = field
+        self.image_label.setPixmap(QPixmap.fromImage(self.current_qimage))
+
+        totals = profiling.summarize(profiling.records_since(self.profile_mark))
+        self.statusBar().showMessage(
+            f"zoom {self.viewport.zoom:.3g}  center ({self.viewport.center_x:.0f}, {self.viewport.center_y:.0f})  "
+            f"tiles {self.viewport.last_rendered}/{self.viewport.last_visible}  " + profiling.format_summary(totals))
+
+    def on_canvas_dragged(self, dx, dy):
+        if self.exploring:
+            self.viewport.pan(dx, dy)
+            self.update_canvas()
+
+    def on_canvas_zoomed(self, steps, x, y):
+        if not self.exploring:
+            return
+        rect = self.image_label.contentsRect()
+        self.viewport.zoom_at(2 ** (steps / 4), x - rect.x(), y - rect.y(), rect.width(), rect.height())
+        # follow on the slider without zooming again
+        percent = round(self.viewport.zoom * 100)
+        self.scale_slider.blockSignals(True)
+        self.scale_slider.setValue(min(max(percent, self.scale_slider.minimum()), self.scale_slider.maximum()))
+        self.scale_slider.blockSignals(False)
+        self.scale_percent = percent
+        self.scale_edit.setText(str(percent))
+        self.update_canvas()
 
     def apply_modifier(self):
+        if self.field is None:
+            return
         mod_name = self.mod_combo.currentText()
         mod_cls = self.modifier_classes[mod_name]
         mod_params = self.collect_params(self.modifier_param_widgets)
         mod_instance = mod_cls()
-        
-        self.np_img = mod_instance.apply(self.np_img, mod_params)
-        h, w = self.np_img.shape[:2]
-        self.current_qimage = QImage(self.np_img.data, w, h, 3 * w, QImage.Format.Format_RGB888).copy()
+        field = self.field
+
+        stack = ModifierStack([(mod_instance, mod_params)])
+        if self.exploring:
+            # applied to every frame of the canvas
+            self.viewport.modifiers = stack
+            self.update_canvas()
+            return
+        self.start_task(lambda task: stack.apply_field(field), self.on_modify_finished)
+
+    def on_modify_finished(self, job_id, result):
+        if not self.is_current(job_id):
+            return
+        self.field = result
+        self.show_field()
+
+    def show_field(self):
+        self.set_display(self.field)
+        totals = profiling.summarize(profiling.records_since(self.profile_mark))
+        self.statusBar().showMessage(profiling.format_summary(totals))
+
+    def set_display(self, field, display_size=None):
+        # The QImage points into display_buffer, so both are replaced together
+        self.current_qimage, self.display_buffer = field_to_qimage(field)
+        self.display_size = display_size or (self.current_qimage.width(), self.current_qimage.height())
+        self.mips = [self.current_qimage]
+        self.pixmap_cache.clear()
         self.update_view()
 
+    # Halved copies of the current image, built on demand. Downscaling starts
+    # from the smallest level that is still at least as large as the target.
+    def mip_for(self, width):
+        while self.mips[-1].width() >= 2 * width and self.mips[-1].width() > 1:
+            last = self.mips[-1]
+            self.mips.append(last.scaled(
+                max(1, last.width() // 2), max(1, last.height() // 2),
+                Qt.AspectRatioMode.IgnoreAspectRatio,
+                Qt.TransformationMode.SmoothTransformation
+            ))
+        for mip in reversed(self.mips):
+            if mip.width() >= width:
+                return mip
+        return self.mips[0]
+
+    # Zooming in uses nearest pixels, zooming out filters from the nearest
+    # mip. While the slider is dragged the cheap filter is used and the
+    # smooth one follows on release.
+    def scaled_pixmap(self, percent, smooth=True):
+        key = (percent, smooth)
+        if key in self.pixmap_cache:
+            self.pixmap_cache.move_to_end(key)
+            return self.pixmap_cache[key]
+
+        w = max(1, int(self.display_size[0] * percent / 100))
+        h = max(1, int(self.display_size[1] * percent / 100))
+        with profiling.stage("scale", pixels=w * h):
+            source = self.mip_for(w)
+            if source.width() == w and source.height() == h:
+                pixmap = QPixmap.fromImage(source)
+            else:
+                if smooth and source.width() > w:
+                    mode = Qt.TransformationMode.SmoothTransformation
+                else:
+                    mode = Qt.TransformationMode.FastTransformation
+                pixmap = QPixmap.fromImage(source.scaled(w, h, Qt.AspectRatioMode.KeepAspectRatio, mode))
+
+        self.pixmap_cache[key] = pixmap
+        if len(self.pixmap_cache) > PIXMAP_CACHE_SIZE:
+            self.pixmap_cache.popitem(last=False)
+        return pixmap
+
     def update_view(self):
+        if self.exploring:
+            self.viewport.set_zoom(self.scale_percent / 100)
+            self.update_canvas()
+            return
         if self.current_qimage is None:
             return
-        
-        scaled = self.current_qimage.scaled(
-            int(self.current_qimage.width() * self.scale_percent / 100),
-            int(self.current_qimage.height() * self.scale_percent / 100),
-            Qt.AspectRatioMode.KeepAspectRatio,
-            Qt.TransformationMode.SmoothTransformation
-        )
 
-        self.image_label.setPixmap(QPixmap.fromImage(scaled))
+        smooth = not self.scale_slider.isSliderDown()
+        self.image_label.setPixmap(self.scaled_pixmap(self.scale_percent, smooth))
 
     def on_slider_changed(self, value):
         self.scale_percent = value
@@ -282,15 +640,41 @@ class NoiseGenApp(QMainWindow):
             self.scale_edit.setText(str(self.scale_percent))
             QMessageBox.warning(self, "Error", "Only number from 10 to 800")
 
+    # Saves the full precision field on the pool, renders keep going meanwhile
     def save_image(self):
-        if not self.current_qimage:
+        if self.field is None:
             return
         from PyQt6.QtWidgets import QFileDialog
-        path, _ = QFileDialog.getSaveFileName(self, "Save", "", "PNG (*.png)")
-        if path:
-            if not path.endswith(".png"):
-                path += ".png"
-            self.current_qimage.save(path, "PNG")
+        path, selected = QFileDialog.getSaveFileName(self, "Save", "", ";;".join(EXPORT_FILTERS))
+        if not path:
+            return
+        bit_depth, ext = EXPORT_FILTERS.get(selected, (None, ".png"))
+        if not os.path.splitext(path)[1]:
+            path += ext
+        field = self.field
+        level = self.compress_spin.value()
+
+        def job(task):
+            export(field, path, bit_depth, level, task.report_progress, lambda: task.cancelled)
+            return path
+
+        self.export_id += 1
+        task = RenderTask(self.export_id, job)
+        task.signals.progress.connect(self.on_export_progress)
+        task.signals.finished.connect(self.on_export_finished)
+        task.signals.failed.connect(self.on_export_failed)
+        task.signals.done.connect(lambda export_id: self.exports.pop(export_id, None))
+        self.exports[task.job_id] = task
+        self.thread_pool.start(task)
+
+    def on_export_progress(self, export_id, done, total):
+        self.statusBar().showMessage(f"Exporting... {100 * done // max(total, 1)}%")
+
+    def on_export_finished(self, export_id, path):
+        self.statusBar().showMessage(f"Saved {path}")
+
+    def on_export_failed(self, export_id, message):
+        QMessageBox.warning(self, "Export failed", message)
 
 
 
@@ -0,0 +1,317 @@
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+
+from registry import GENERATORS, MODIFIERS, Instances, default_params
+from cache import ResultCache
+from field import NoiseField
+from modifiers import ModifierStack
+import profiling
+
+################
+#
+#  Headless batch renderer, never imports Qt.
+#
+#  Single job:
+#    python noisegen.py PerlinNoise -o perlin.png --param size=1024 --param seed=7
+#    python noisegen.py WorleyNoise -o cells.png --params '{"mode": "F2 - F1"}' -m OneMinus -m PowerOfX:value=1.5
+#
+#  Many jobs from one manifest (JSON list of jobs):
+#    python noisegen.py --manifest jobs.json
+#    [{"generator": "PerlinNoise", "params": {"seed": 1}, "modifiers": [{"name": "OneMinus"}], "output": "p1.png"}, ...]
+#
+#  Outputs are written by export.py: .npy as float32 fields, .png as 8 or
+#  16 bit (--bit-depth) with --compress-level, .r16/.raw/.r32 as headerless
+#  heightmaps, .npz as a float32 mip chain (base and box filtered levels,
+#  --mip-levels limits them), everything else through PIL as 8-bit
+#  grayscale (or RGB for colored generators).
+#  Generator results are cached per run, --cache-dir also keeps them on disk.
+#  --graph evaluates a node graph JSON (see graph.py), manifest jobs can
+#  give "graph" as a path or an inline dict instead of "generator".
+#  --tile renders out of core into a .npy memmap (noise generators only).
+#  --volume DEPTH streams a 3D (depth, size, size) .npy volume, --frames N
+#  writes an animation to a numbered output pattern like "f_{:04d}.png",
+#  moving --speed pixels through the volume per frame (see volumes.py).
+#  --seeds 1-64 (or 1,5,9) renders a variation set in one batch (see
+#  NoiseGenerator.generate_batch): a .npy output gets the (N, size, size)
+#  stack, other outputs are a pattern formatted with the seed, "v_{}.png".
+#  --profile PATH writes per-stage timings as JSON, --log-stages logs every
+#  stage as a JSON line on stderr.
+#  --check-import times "import registry" in a fresh interpreter against
+#  IMPORT_BUDGET_MS and fails if it goes over or drags in Qt.
+#
+################
+
+# Registry entries are resolved lazily, so importing it should not load
+# numpy, PIL or Qt. Measured at ~4 ms on a plain CPython 3.11.
+IMPORT_BUDGET_MS = 20
+
+
+def parse_value(text):
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def parse_assignments(items):
+    params = {}
+    for item in items:
+        name, sep, value = item.partition("=")
+        if not sep:
+            raise ValueError(f"Expected name=value, got '{item}'")
+        params[name.strip()] = parse_value(value.strip())
+    return params
+
+
+# "Name" or "Name:key=value,key=value"
+def parse_modifier(spec):
+    name, _, args = spec.partition(":")
+    params = parse_assignments([a for a in args.split(",") if a]) if args else {}
+    return {"name": name, "params": params}
+
+
+def parse_seeds(text):
+    seeds = []
+    for part in text.split(","):
+        first, _, last = part.partition("-")
+        seeds.extend(range(int(first), int(last) + 1) if last else [int(first)])
+    return seeds
+
+
+class BatchRenderer:
+    def __init__(self, cache=None):
+        # Instances are reused between jobs
+        self.generators = Instances(GENERATORS)
+        self.modifiers = Instances(MODIFIERS)
+        self.cache = cache if cache is not None else ResultCache()
+
+    def _generator(self, name):
+        return self.generators[name]
+
+    def _modifier(self, name):
+        return self.modifiers[name]
+
+    # Defaults of instance (the job's generator if not given) updated with
+    # the job's params. Modifier entries have the same "params" key.
+    def _params(self, job, instance=None):
+        params = default_params(instance or self._generator(job["generator"]))
+        params.update(job.get("params", {}))
+        return params
+
+    def _stack(self, job) -> ModifierStack:
+        stack = ModifierStack()
+        for mod in job.get("modifiers", []):
+            modifier = self._modifier(mod["name"])
+            stack.add(modifier, self._params(mod, modifier))
+        return stack
+
+    def render(self, job) -> NoiseField:
+        generator = self._generator(job["generator"])
+        params = self._params(job)
+        field = self.cache.get(job["generator"], params)
+        if field is None:
+            # mip chains are built with the render, modifiers rebuild them
+            mips = job.get("output", "").endswith(".npz")
+            field = generator.generate_field(params, mips, job.get("mip_levels"))
+            field = self.cache.put(job["generator"], params, field)
+        if not job.get("modifiers"):
+            return field
+        return self._stack(job).apply_field(field)
+
+    def run_volume(self, job):
+        from volumes import VOLUMES, write_frames, write_volume
+
+        if job["generator"] not in VOLUMES:
+            raise KeyError(f"No 3D version of '{job['generator']}', expected one of {list(VOLUMES)}")
+        if job.get("modifiers"):
+            raise ValueError("Modifiers are not supported for volumes")
+        volume = VOLUMES[job["generator"]]()
+        params = self._params(job, volume)
+        if job.get("frames"):
+            write_frames(volume, params, job["output"], job["frames"], job.get("speed", 1.0))
+        else:
+            if not job["output"].endswith(".npy"):
+                raise ValueError("Volumes are written as .npy")
+            write_volume(volume, params, job["output"], job["volume"])
+
+    def run_batch(self, job):
+        import numpy as np
+        from base import batch_seeds
+
+        generator = self._generator(job["generator"])
+        params = self._params(job)
+        stack = self._stack(job)
+        seeds = batch_seeds(params, job["seeds"])
+        stacked = job["output"].endswith(".npy")
+        if not stacked and len({job["output"].format(seed) for seed in seeds}) < len(seeds):
+            raise ValueError(f"Output '{job['output']}' needs a {{}} for the seed, e.g. noise_{{}}.png, "
+                             f"or a .npy to stack the batch")
+
+        data = generator.generate_batch(params, seeds)
+        fields = [stack.apply_field(NoiseField(d, job["generator"], dict(params, seed=seed)), in_place=True)
+                  for d, seed in zip(data, seeds)]
+        if stacked:
+            np.save(job["output"], np.stack([f.data for f in fields]))
+        else:
+            for field, seed in zip(fields, seeds):
+                self.write(field, dict(job, output=job["output"].format(seed)))
+
+    def render_graph(self, job) -> NoiseField:
+        from graph import Graph
+
+        spec = job["graph"]
+        graph = Graph.load(spec, self.cache) if isinstance(spec, str) else Graph.from_dict(spec, self.cache)
+        return graph.evaluate(job.get("node"))
+
+    def run(self, job):
+        output = job["output"]
+        if job.get("volume") or job.get("frames"):
+            self.run_volume(job)
+            return
+        if job.get("seeds"):
+            self.run_batch(job)
+            return
+        if job.get("tile"):
+            from render import render_tiled
+
+            if job.get("modifiers"):
+                raise ValueError("Modifiers are not supported for tiled renders")
+            generator = self._generator(job["generator"])
+            params = self._params(job)
+            if output.endswith(".npy"):
+                render_tiled(generator, params, output, tile_size=job["tile"], workers=job.get("workers", 1))
+                return
+            # other formats stream from a temporary memmap
+            tmp = output + ".tiles.npy"
+            try:
+                data = render_tiled(generator, params, tmp, tile_size=job["tile"], workers=job.get("workers", 1))
+                self.write(NoiseField(data, job["generator"], params), job)
+                del data
+            finally:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+            return
+
+        field = self.render_graph(job) if job.get("graph") else self.render(job)
+        self.write(field, job)
+
+    def write(self, field, job):
+        from export import export, DEFAULT_COMPRESS_LEVEL
+
+        export(field, job["output"], job.get("bit_depth"), job.get("compress_level", DEFAULT_COMPRESS_LEVEL),
+               mip_levels=job.get("mip_levels"))
+
+
+def check_import_time(budget_ms=IMPORT_BUDGET_MS):
+    code = (
+        "import json, sys, time\n"
+        "t = time.perf_counter()\n"
+        "import registry\n"
+        "ms = (time.perf_counter() - t) * 1000\n"
+        "print(json.dumps({'ms': ms, 'qt': any(m.startswith('PyQt') for m in sys.modules)}))\n"
+    )
+    here = os.path.dirname(os.path.abspath(__file__))
+    proc = subprocess.run([sys.executable, "-c", code], cwd=here, capture_output=True, text=True, check=True)
+    result = json.loads(proc.stdout)
+    print(f"import registry: {result['ms']:.2f} ms (budget {budget_ms} ms), Qt loaded: {result['qt']}")
+    return 0 if result["ms"] <= budget_ms and not result["qt"] else 1
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="noisegen", description="Render noise textures without the GUI")
+    parser.add_argument("generator", nargs="?", help="generator name, see --list")
+    parser.add_argument("-o", "--output", help="output file (.png, .npy, ...)")
+    parser.add_argument("--params", default="{}", help="generator params as JSON")
+    parser.add_argument("-p", "--param", action="append", default=[], metavar="NAME=VALUE",
+                        help="single generator param, value parsed as JSON if possible")
+    parser.add_argument("-m", "--modifier", action="append", default=[], metavar="NAME[:K=V,...]",
+                        help="modifier to apply, can be repeated to build a chain")
+    parser.add_argument("--manifest", help="JSON file with a list of jobs")
+    parser.add_argument("--graph", help="node graph JSON to evaluate instead of a generator (see graph.py)")
+    parser.add_argument("--node", help="graph node to output, defaults to the graph's output")
+    parser.add_argument("--bit-depth", type=int, choices=[8, 16, 32],
+                        help="8 or 16 for PNG, 16 or 32 for RAW heightmaps")
+    parser.add_argument("--compress-level", type=int, default=6, choices=range(10), metavar="0-9",
+                        help="PNG zlib level, 0 is fastest")
+    parser.add_argument("--mip-levels", type=int, metavar="N", help="levels of a .npz mip chain, default down to 1x1")
+    parser.add_argument("--tile", type=int, default=0, help="render out of core with this tile size")
+    parser.add_argument("--volume", type=int, default=0, metavar="DEPTH", help="render a 3D .npy volume")
+    parser.add_argument("--frames", type=int, default=0, help="render an animation, output is a pattern")
+    parser.add_argument("--speed", type=float, default=1.0, help="pixels moved through z per frame")
+    parser.add_argument("--seeds", type=parse_seeds, metavar="A-B,C", help="render one variation per seed")
+    parser.add_argument("--workers", type=int, default=1, help="processes for tiled renders")
+    parser.add_argument("--cache-dir", help="keep rendered results in this directory between runs")
+    parser.add_argument("--list", action="store_true", help="list generators and modifiers")
+    parser.add_argument("--check-import", action="store_true", help="check import time of the registry")
+    parser.add_argument("--profile", metavar="PATH", help="write per-stage timings to this JSON file")
+    parser.add_argument("--log-stages", action="store_true", help="log every stage timing to stderr")
+    parser.add_argument("--trace-memory", action="store_true", help="add tracemalloc peaks to stage timings")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    if args.check_import:
+        return check_import_time()
+
+    if args.list:
+        print("Generators:", ", ".join(GENERATORS))
+        print("Modifiers: ", ", ".join(MODIFIERS))
+        return 0
+
+    if args.manifest:
+        with open(args.manifest) as f:
+            jobs = json.load(f)
+    elif args.graph and args.output:
+        jobs = [{"graph": args.graph, "node": args.node, "output": args.output,
+                 "bit_depth": args.bit_depth, "compress_level": args.compress_level, "mip_levels": args.mip_levels}]
+    elif args.generator and args.output:
+        params = json.loads(args.params)
+        params.update(parse_assignments(args.param))
+        jobs = [{
+            "generator": args.generator,
+            "params": params,
+            "modifiers": [parse_modifier(m) for m in args.modifier],
+            "output": args.output,
+            "tile": args.tile,
+            "workers": args.workers,
+            "bit_depth": args.bit_depth,
+            "compress_level": args.compress_level,
+            "mip_levels": args.mip_levels,
+            "volume": args.volume,
+            "frames": args.frames,
+            "speed": args.speed,
+            "seeds": args.seeds,
+        }]
+    else:
+        parser.error("need a generator or --graph and --output, or --manifest")
+
+    if args.profile or args.log_stages:
+        if args.log_stages:
+            logging.basicConfig(level=logging.INFO, format="%(message)s")
+        profiling.enable(trace_memory=args.trace_memory, log=args.log_stages)
+
+    renderer = BatchRenderer(ResultCache(disk_dir=args.cache_dir))
+    failed = 0
+    for job in jobs:
+        try:
+            renderer.run(job)
+        except Exception as e:
+            failed += 1
+            print(f"{job.get('output', '?')}: {e}", file=sys.stderr)
+
+    if args.profile:
+        profiling.dump(args.profile)
+    return 1 if failed else 0
+
+
+
+# Entry point
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,12 +1,42 @@
+import hashlib
 import math
 import numpy as np
-from PIL import Image
 
-from base import NoiseGenerator
+import profiling
+from base import NoiseGenerator, batch_seeds
+from cache import LayerCache
 
+# sample() and generate_batch() work through this many points at a time to
+# bound temporaries
+SAMPLE_CHUNK = 32 * 1024
+# float64 octave sums generate_batch() keeps at once, larger batches go in groups
+BATCH_BYTES = 256 * 1024 * 1024
+
+
+def _sample_chunks(fn, xs, ys):
+    xs, ys = np.broadcast_arrays(np.asarray(xs, dtype=np.float64), np.asarray(ys, dtype=np.float64))
+    flat_x = xs.ravel()
+    flat_y = ys.ravel()
+    out = np.empty(flat_x.shape)
+    for start in range(0, out.size, SAMPLE_CHUNK):
+        end = start + SAMPLE_CHUNK
+        out[start:end] = fn(flat_x[start:end], flat_y[start:end])
+    return out.reshape(xs.shape)
+
+
+# Runs of equal values in a 1D index array, as (values, lengths). Lattice
+# cells of a row of pixels come in runs, and np.repeat(a[:, values], lengths,
+# axis=1) is a[:, index] without the column major result of fancy indexing,
+# which slows down everything it is combined with.
+def _runs(index):
+    starts = np.flatnonzero(index[1:] != index[:-1]) + 1
+    starts = np.concatenate(([0], starts))
+    return index[starts], np.diff(np.append(starts, len(index)))
 
 
 class WhiteNoiseGenerator(NoiseGenerator):
+    normalized = False
+
     def __init__(self):
         self.data = None
 
@@ -14,17 +44,38 @@ class WhiteNoiseGenerator(NoiseGenerator):
         sizes = [64, 128, 256, 512, 1024, 2048, 4096]
         return {
             "size": {"type": "choise", "label": "Size", "default": 512, "options": sizes},
+            "seed": {"type": "int", "label": "Seed", "default": 1},
             "colored": {"type": "bool", "label": "IsColored", "default": False},
         }
 
-    def generate(self, params):
+    # Values come from a hash of (seed, x, y, channel) rather than a running
+    # random stream, so any tile of the image can be produced on its own.
+    def _hash(self, xs, ys, channel):
+        hx = np.asarray(xs).astype(np.int64).astype(np.uint64)[:, None]
+        hy = np.asarray(ys).astype(np.int64).astype(np.uint64)[None, :]
+        h = (hx * np.uint64(0x9E3779B97F4A7C15)) ^ (hy * np.uint64(0xC2B2AE3D27D4EB4F))
+        h ^= np.uint64(((self.seed * 4 + channel) * 0x165667B19E3779F9) & 0xFFFFFFFFFFFFFFFF)
+        # splitmix64 finalizer
+        h ^= h >> np.uint64(30)
+        h *= np.uint64(0xBF58476D1CE4E5B9)
+        h ^= h >> np.uint64(27)
+        h *= np.uint64(0x94D049BB133111EB)
+        h ^= h >> np.uint64(31)
+        return (h >> np.uint64(11)) * (1.0 / (1 << 53))
+
+    def setup(self, params):
         self.size = params["size"]
+        self.seed = params.get("seed", 1)
         self.colored = params["colored"]
-        if self.colored:
-            self.data = np.random.randint(0, 255, (self.size, self.size, 3), dtype=np.uint8)
-        else:
-            temp = np.random.randint(0, 255, (self.size, self.size, 3), dtype=np.uint8)
-            self.data = np.stack((temp, temp, temp), axis=-1)
+
+    def evaluate(self, xs, ys):
+        with profiling.stage("evaluate", pixels=len(xs) * len(ys)):
+            if self.colored:
+                return np.stack([self._hash(xs, ys, c) for c in range(3)], axis=-1)
+            return self._hash(xs, ys, 0)
+
+    def generate(self, params):
+        self.data = self.generate_field(params).to_rgb8()
         return self.data
 
     def get_data(self):
@@ -37,7 +88,27 @@ class WhiteNoiseGenerator(NoiseGenerator):
 
 # TODO: fix(use) tiling
 class WorleyNoiseGenerator(NoiseGenerator):
+    # Fixed value ranges per mode for sample(), in grid cell units. With one
+    # feature point per cell F1 <= sqrt(2) and F2 <= sqrt(5); ratio and
+    # trigonometric modes are clipped to their useful range.
+    sample_ranges = {
+        "F1": (0.0, math.sqrt(2)),
+        "F2": (0.0, math.sqrt(5)),
+        "F2 + F1": (0.0, math.sqrt(2) + math.sqrt(5)),
+        "F2 - F1": (0.0, math.sqrt(5)),
+        "F2 * F1": (0.0, math.sqrt(10)),
+        "F2 / F1": (1.0, 8.0),
+        "sqrt(F2 * F1)": (0.0, 10 ** 0.25),
+        "sin(F1 * X)": (-1.0, 1.0),
+        "cos(F1 * X)": (-1.0, 1.0),
+    }
+
+    # F1/F2 fields shared by all instances, see distance_fields()
+    distance_cache = LayerCache()
+    batch_min_size = 64
+
     def __init__(self):
+        self.size = 0
         self.F1 = None
         self.F2 = None
         self.data = None
@@ -68,14 +139,13 @@ class WorleyNoiseGenerator(NoiseGenerator):
             "value": {"type": "float", "label": "Mode value(X)", "default": 16, "min": 0.01, "max": 1000.0},
         }
 
-    def _generate_points(self):
-        points = np.zeros((self.grid_size, self.grid_size, 2))
-        for j in range(self.grid_size):
-            for i in range(self.grid_size):
-                x = np.random.random()
-                y = np.random.random()
-                points[i, j, 0] = x + i
-                points[i, j, 1] = y + j
+    def _generate_points(self, rng):
+        # same draw order as filling points[i, j] for j, then i
+        rand = rng.random_sample((self.grid_size, self.grid_size, 2)).transpose(1, 0, 2)
+        cells = np.arange(self.grid_size, dtype=np.float64)
+        points = np.empty((self.grid_size, self.grid_size, 2))
+        points[:, :, 0] = rand[:, :, 0] + cells[:, None]
+        points[:, :, 1] = rand[:, :, 1] + cells[None, :]
         self.points = points
 
     def _dist_square(self, x1, y1, x2, y2):
@@ -109,49 +179,187 @@ class WorleyNoiseGenerator(NoiseGenerator):
         distances = self._get_dists(scaled_x, scaled_y, n)
         return self.modes[mode](distances[0], distances[1])
 
-    def generate(self, params):
-        if self.params == params:
-            return self.data
-        else:
-            self.params = params
+    # F1 and F2 for broadcastable arrays of scaled coords. Each pixel is
+    # checked against the 3x3 feature points around its cell, keeping the two
+    # smallest distances instead of sorting all nine. out is an optional
+    # (2, ...) array for the result.
+    def distances_array(self, x, y, out=None):
+        cell_x = np.floor(x).astype(int) % self.grid_size
+        cell_y = np.floor(y).astype(int) % self.grid_size
+        points_x = np.ascontiguousarray(self.points[:, :, 0])
+        points_y = np.ascontiguousarray(self.points[:, :, 1])
+
+        shape = np.broadcast_shapes(np.shape(x), np.shape(y))
+        if out is None:
+            out = np.empty((2,) + shape)
+        f1, f2 = out
+        f1.fill(np.inf)
+        f2.fill(np.inf)
+        for dx in range(-1, 2):
+            near_x = (cell_x + dx) % self.grid_size
+            for dy in range(-1, 2):
+                near_y = (cell_y + dy) % self.grid_size
 
-        self.size = params["size"]
+                ddx = points_x[near_x, near_y] - x
+                ddy = points_y[near_x, near_y] - y
+                dist = np.sqrt(ddx * ddx + ddy * ddy)
+
+                np.minimum(f2, np.maximum(f1, dist), out=f2)
+                np.minimum(f1, dist, out=f1)
+        return f1, f2
+
+    # distances_array for a grid of 1D scaled coords, x along rows and y
+    # along columns. Squared offsets are worked out per row and lattice
+    # column, and per lattice row and column, then gathered to the grid,
+    # with the same sums as distances_array.
+    def grid_distances(self, x, y, out):
+        g = self.grid_size
+        cell_x = np.floor(x).astype(int) % g
+        cell_y = np.floor(y).astype(int) % g
+        f1, f2 = out
+        f1.fill(np.inf)
+        f2.fill(np.inf)
+        for dx in range(-1, 2):
+            near_x = (cell_x + dx) % g
+            for dy in range(-1, 2):
+                near_y = (cell_y + dy) % g
+                cells, lengths = _runs(near_y)
+                ddx = self.points[near_x[:, None], cells[None, :], 0] - x[:, None]
+                ddx *= ddx
+                ddy = self.points[:, near_y, 1] - y[None, :]
+                ddy *= ddy
+                dist = np.repeat(ddx, lengths, axis=1)
+                dist += ddy[near_x]
+                np.sqrt(dist, out=dist)
+
+                np.minimum(f2, np.maximum(f1, dist), out=f2)
+                np.minimum(f1, dist, out=f1)
+        return f1, f2
+
+    def noise_array(self, x, y, mode="F1"):
+        scaled_x = x * (self.grid_size / self.size)
+        scaled_y = y * (self.grid_size / self.size)
+
+        f1, f2 = self.distances_array(scaled_x, scaled_y)
+        return self.modes[mode](f1, f2)
+
+    def setup(self, params):
+        self.size = params.get("size", self.size)
         self.grid_size = params["grid_size"]
         self.seed = params["seed"]
         self.tileable = params["tileable"]
         self.mode = params["mode"]
         self.value = params["value"]
-        n = 2
-
-        np.random.seed(self.seed)
-
-        self._generate_points()
-        noise_data = np.zeros((self.size, self.size))
-
-        for y in range(0, self.size):
-            for x in range(0, self.size):
-                val = self.noise(x, y, n, mode=self.mode)
-                noise_data[x, y] = val
 
-        data_min = noise_data.min()
-        data_max = noise_data.max()
+        # Private stream, same sequence as np.random.seed(seed) but safe to
+        # use from several threads or processes at once
+        with profiling.stage("points", pixels=self.grid_size * self.grid_size):
+            self._generate_points(np.random.RandomState(self.seed))
+
+    def distance_fields(self, xs, ys):
+        """F1 and F2 for pixel coords xs (rows) by ys (columns) as one (2, h, w) array, cached."""
+        fields = key = None
+        if self.use_cache:
+            region = hashlib.blake2b(xs.tobytes(), digest_size=16)
+            region.update(ys.tobytes())
+            key = (self.seed, self.grid_size, self.size, self.tileable, len(xs), region.digest())
+            fields = self.distance_cache.get(key)
+        if fields is None:
+            scale = self.grid_size / self.size
+            # the pattern repeats every size pixels, coords outside [0, size) wrap
+            if xs.size and (xs.min() < 0 or xs.max() >= self.size):
+                xs = np.mod(xs, self.size)
+            if ys.size and (ys.min() < 0 or ys.max() >= self.size):
+                ys = np.mod(ys, self.size)
+            fields = np.empty((2, len(xs), len(ys)))
+            self.distances_array(xs[:, None] * scale, ys[None, :] * scale, out=fields)
+            if key is not None:
+                fields = self.distance_cache.put(key, fields)
+        return fields
+
+    # Mode and value only pick how F1 and F2 are combined, so changing them
+    # reuses the cached distances. F1/F2 modes return the cached, read-only
+    # arrays themselves.
+    def evaluate(self, xs, ys):
+        xs = np.asarray(xs, dtype=np.float64)
+        ys = np.asarray(ys, dtype=np.float64)
+        with profiling.stage("evaluate", pixels=xs.size * ys.size):
+            self.F1, self.F2 = self.distance_fields(xs, ys)
+            return self.modes[self.mode](self.F1, self.F2)
+
+    def sample(self, xs, ys, params=None, normalize=True):
+        """
+        Noise at arbitrary points, xs and ys being broadcastable arrays in
+        grid cell units, so pixel (x, y) of a render is (x, y) * grid_size / size.
+        The pattern repeats every grid_size cells. Values are mapped to [0, 1]
+        by the fixed sample_ranges of the mode, not by the batch min/max.
+        """
+        if params is not None:
+            self.setup(params)
+        grid = self.grid_size
+        mode = self.modes[self.mode]
+
+        def kernel(x, y):
+            f1, f2 = self.distances_array(np.mod(x, grid), np.mod(y, grid))
+            return mode(f1, f2)
+
+        with profiling.stage("sample", pixels=np.broadcast(xs, ys).size):
+            values = _sample_chunks(kernel, xs, ys)
+            if normalize:
+                lo, hi = self.value_bounds()
+                values = np.clip((values - lo) / (hi - lo), 0.0, 1.0, out=values)
+        return values
+
+    def value_bounds(self):
+        return self.sample_ranges[self.mode]
+
+    # Seeds only move the feature points, so the scaled coords and the
+    # distance buffers are shared by the batch and distances are worked out
+    # by grid_distances. It works on its own instance and skips
+    # distance_cache, which a batch would only flush.
+    def generate_batch(self, params, seeds):
+        if params["size"] < self.batch_min_size:
+            return super().generate_batch(params, seeds)
+        seeds = batch_seeds(params, seeds)
+        other = type(self)()
+        other.setup(params)
+        size = other.size
+        coords = np.arange(size, dtype=np.float64)
+        scale = other.grid_size / size
+        scaled = coords * scale
+
+        fields = np.empty((2, size, size))
+        out = np.empty((len(seeds), size, size), dtype=np.float32)
+        mode = other.modes[other.mode]
+        for k, seed in enumerate(seeds):
+            with profiling.stage("batch", pixels=size * size):
+                other._generate_points(np.random.RandomState(seed))
+                other.grid_distances(scaled, scaled, fields)
+                out[k] = other.make_field(mode(*fields), dict(params, seed=seed)).data
+        return out
 
-        if data_max > data_min:
-            noise_data = (noise_data - data_min) / (data_max - data_min)
-        u8noise_data = (noise_data * 255).astype(np.uint8)
-        self.data = np.stack((u8noise_data, u8noise_data, u8noise_data), axis=-1)
+    def generate(self, params):
+        self.data = self.generate_field(params).to_rgb8()
         return self.data
 
     def get_data(self):
         return self.data
 
     def to_image(self):
+        from PIL import Image
+
         return Image.fromarray(self.data)
 
 
 
 # TODO: Fix tiling
 class PerlinNoiseGenerator(NoiseGenerator):
+    # Single octaves shared by all instances. A layer only depends on the
+    # seed, grid, size, octave index and region, so changing persistance or
+    # the octave count re-weights cached layers instead of evaluating again.
+    layer_cache = LayerCache()
+    batch_min_size = 96
+
     def __init__(self):
         self.size = 0
         self.grid_size = 0
@@ -190,13 +398,13 @@ class PerlinNoiseGenerator(NoiseGenerator):
     def _lerp(self, t, a1, a2):
         return a1 + t * (a2 - a1)
 
-    def _generate_vectors(self):
+    def _generate_vectors(self, rng):
         step = math.pi * 2.0 / self.tablesize
         angles = np.arange(self.tablesize) * step
         self.grads = np.stack((np.cos(angles), np.sin(angles)), axis=1)
         self.table = np.arange(self.tablesize, dtype=int)
         self.table = np.concatenate((self.table, self.table))
-        np.random.shuffle(self.table)
+        rng.shuffle(self.table)
 
     def _get_vec(self, x, y):
         index = self.table[self.table[x] + y]
@@ -248,35 +456,400 @@ class PerlinNoiseGenerator(NoiseGenerator):
 
         return total
 
-    def generate(self, params):
-        self.size = params["size"]
+    # Array versions of noise/octave_noise. x and y can be any arrays that
+    # broadcast against each other, e.g. a column and a row of pixel coords
+    # for a whole grid. Same operations as the scalar path, so results match;
+    # exact=False trades that for a faster fade.
+    def noise_array(self, x, y, exact=True):
+        fx = np.floor(x)
+        fy = np.floor(y)
+        x0 = fx.astype(int) % 256
+        y0 = fy.astype(int) % 256
+        x1 = (x0 + 1) % 256
+        y1 = (y0 + 1) % 256
+
+        sx = x - fx
+        sy = y - fy
+
+        # corner vectors of pixel grid cell, gathered per component
+        gx = self.grads[:, 0]
+        gy = self.grads[:, 1]
+        row0 = self.table[x0]
+        row1 = self.table[x1]
+        i00 = self.table[row0 + y0]
+        i01 = self.table[row0 + y1]
+        i10 = self.table[row1 + y0]
+        i11 = self.table[row1 + y1]
+
+        h0 = sx * gx[i00] + sy * gy[i00]
+        h1 = sx * gx[i01] + (sy - 1) * gy[i01]
+        h2 = (sx - 1) * gx[i10] + sy * gy[i10]
+        h3 = (sx - 1) * gx[i11] + (sy - 1) * gy[i11]
+
+        if exact:
+            u = 6 * np.float_power(sx, 5.0) - 15 * np.float_power(sx, 4.0) + 10 * np.float_power(sx, 3.0)
+            v = 6 * np.float_power(sy, 5.0) - 15 * np.float_power(sy, 4.0) + 10 * np.float_power(sy, 3.0)
+        else:
+            # Horner form, ~1e-15 off the pow() version and much cheaper
+            u = sx * sx * sx * (sx * (sx * 6 - 15) + 10)
+            v = sy * sy * sy * (sy * (sy * 6 - 15) + 10)
+
+        l1 = h0 + u * (h2 - h0)
+        l2 = h1 + u * (h3 - h1)
+
+        return l1 + v * (l2 - l1)
+
+    def octave_noise_array(self, x, y):
+        total = np.zeros(np.broadcast_shapes(np.shape(x), np.shape(y)))
+        amplitude = self.persistance
+        frequency = 1.0 / self.size * self.grid_size
+
+        for i in range(self.octaves):
+            total += amplitude * self.noise_array(x * frequency, y * frequency)
+            amplitude *= 0.5
+            frequency *= 2.0
+
+        return total
+
+    def setup(self, params):
+        self.size = params.get("size", self.size)
         self.grid_size = params["grid_size"]
         self.octaves = params["octaves"]
         self.persistance = params["persistance"]
         self.seed = params["seed"]
         self.tileable = params["tileable"]
 
-        np.random.seed(self.seed)
-
-        self._generate_vectors()
-        noise_data = np.zeros((self.size, self.size))
-        u8noise_data = np.zeros((self.size, self.size), dtype=np.uint8)
+        with profiling.stage("vectors", pixels=self.tablesize):
+            self._generate_vectors(np.random.RandomState(self.seed))
+        if self.use_cache:
+            # all float64 octaves of a full render, so re-weighting hits
+            self.layer_cache.reserve(self.octaves * self.size * self.size * 8)
 
-        for y in range(self.size):
-            for x in range(self.size):
-                val = self.octave_noise(x, y)
-                #val = (val + 1.0) * 0.5
-                noise_data[x, y] = val
-
-        data_min = noise_data.min()
-        data_max = noise_data.max()
+    # same doubling as octave_noise_array, so frequencies match bit for bit
+    def frequency(self, octave):
+        frequency = 1.0 / self.size * self.grid_size
+        for _ in range(octave):
+            frequency *= 2.0
+        return frequency
+
+    def octave_layer(self, xs, ys, octave):
+        frequency = self.frequency(octave)
+        return self.noise_array(xs[:, None] * frequency, ys[None, :] * frequency)
+
+    def _cached_layer(self, xs, ys, octave):
+        region = hashlib.blake2b(xs.tobytes(), digest_size=16)
+        region.update(ys.tobytes())
+        key = (type(self).__name__, self.seed, self.grid_size, self.size, octave, len(xs), region.digest())
+        layer = self.layer_cache.get(key)
+        if layer is None:
+            layer = self.layer_cache.put(key, self.octave_layer(xs, ys, octave))
+        return layer
+
+    # Same sum, in the same order, as octave_noise_array, so the result is
+    # identical whether layers come from the cache or not
+    def evaluate(self, xs, ys):
+        xs = np.asarray(xs, dtype=np.float64)
+        ys = np.asarray(ys, dtype=np.float64)
+        with profiling.stage("evaluate", pixels=xs.size * ys.size):
+            total = np.zeros((len(xs), len(ys)))
+            amplitude = self.persistance
+            for i in range(self.octaves):
+                layer = self._cached_layer(xs, ys, i) if self.use_cache else self.octave_layer(xs, ys, i)
+                total += amplitude * layer
+                amplitude *= 0.5
+            return total
+
+    # |noise| <= sqrt(2) / 2 for unit gradients, summed over the octave amplitudes
+    def sample_bound(self):
+        return math.sqrt(2) / 2 * abs(self.persistance) * (2.0 - 0.5 ** (self.octaves - 1))
+
+    def sample(self, xs, ys, params=None, normalize=True):
+        """
+        Noise at arbitrary points, xs and ys being broadcastable arrays in
+        lattice units of the first octave, so pixel (x, y) of a render is
+        (x, y) * grid_size / size. Values are mapped to [0, 1] by the
+        theoretical bound of the octave sum, not by the batch min/max.
+        """
+        if params is not None:
+            self.setup(params)
+
+        def kernel(x, y):
+            total = np.zeros(x.shape)
+            amplitude = self.persistance
+            frequency = 1.0
+            for i in range(self.octaves):
+                total += amplitude * self.noise_array(x * frequency, y * frequency, exact=False)
+                amplitude *= 0.5
+                frequency *= 2.0
+            return total
+
+        with profiling.stage("sample", pixels=np.broadcast(xs, ys).size):
+            values = _sample_chunks(kernel, xs, ys)
+            if normalize:
+                lo, hi = self.value_bounds()
+                values = np.clip((values - lo) / (hi - lo), 0.0, 1.0, out=values)
+        return values
+
+    def value_bounds(self):
+        bound = self.sample_bound() or 1.0
+        return -bound, bound
+
+    # Batch rendering. Only the permutation table depends on the seed, so
+    # lattice_plan() works out everything else once per band and octave and
+    # plan_layer() finishes one octave for the tables of one seed. While
+    # lattice cells span several pixel columns an octave is written as
+    #   (1-v) * M1[cy] + (1-v) * sy * M2[cy] + v * M3[cy] + v * (sy-1) * M4[cy]
+    # with row/column weights from the plan and small (rows, cells) matrices
+    # M of the corner gradients, so the per pixel work is a few copies and
+    # multiply-adds. Finer octaves keep the per pixel lerps of noise_array
+    # with the corner indices from the plan. Matches generate_field() to
+    # float64 rounding, like noise_array with exact=False.
+
+    def lattice_plan(self, xs, ys, octave):
+        frequency = self.frequency(octave)
+        x = xs * frequency
+        y = ys * frequency
+        fx = np.floor(x)
+        fy = np.floor(y)
+        x0 = fx.astype(int) % 256
+        y0 = fy.astype(int) % 256
+        x1 = (x0 + 1) % 256
+        y1 = (y0 + 1) % 256
+        sx = x - fx
+        sy = y - fy
+        u = sx * sx * sx * (sx * (sx * 6 - 15) + 10)
+        v = sy * sy * sy * (sy * (sy * 6 - 15) + 10)
+        # lattice columns of the pixel columns, as runs
+        cells, lengths = _runs(y0)
+
+        if 4 * len(cells) > len(ys):
+            # index into the (256, 256) corner tables of seed_tables()
+            corners = [(a * 256)[:, None] + b[None, :] for a in (x0, x1) for b in (y0, y1)]
+            return "pixels", (corners, sx[:, None], sy[None, :], u[:, None], v[None, :])
+        rows = (x0, x1, ((1 - u) * sx)[:, None], (u * (sx - 1))[:, None], (1 - u)[:, None], u[:, None])
+        columns = (cells, (cells + 1) % 256, lengths, 1 - v, (1 - v) * sy, v, v * (sy - 1))
+        return "cells", (rows, columns)
+
+    def seed_tables(self, seed):
+        other = type(self)()
+        other._generate_vectors(np.random.RandomState(seed))
+        table = other.table
+        # gradient index table[table[x] + y] of every lattice corner
+        corners = table[table[:256, None] + np.arange(256)[None, :]]
+        return other.grads[corners, 0], other.grads[corners, 1]
+
+    def plan_layer(self, plan, tables, amplitude=1.0, out=None):
+        """amplitude * octave for the tables of one seed, added to out if given."""
+        kind, plan = plan
+        gx, gy = tables
+        if kind == "pixels":
+            layer = self._pixels_layer(plan, gx.ravel(), gy.ravel())
+            layer *= amplitude
+            if out is None:
+                return layer
+            out += layer
+            return out
+
+        (x0, x1, p0, p1, q0, q1), (c0, c1, lengths, w1, w2, w3, w4) = plan
+        gx0, gx1 = gx[x0], gx[x1]
+        gy0, gy1 = gy[x0], gy[x1]
+        if out is None:
+            out = np.zeros((len(x0), len(w1)))
+
+        # lerps along x of the dot products, per row and lattice column
+        m1 = p0 * gx0[:, c0] + p1 * gx1[:, c0]
+        m2 = q0 * gy0[:, c0] + q1 * gy1[:, c0]
+        m3 = p0 * gx0[:, c1] + p1 * gx1[:, c1]
+        m4 = q0 * gy0[:, c1] + q1 * gy1[:, c1]
+
+        for m, w in ((m1, w1), (m2, w2), (m3, w3), (m4, w4)):
+            m *= amplitude
+            term = np.repeat(m, lengths, axis=1)
+            term *= w
+            out += term
+        return out
+
+    @staticmethod
+    def _pixels_layer(plan, gx, gy):
+        (i00, i01, i10, i11), sx, sy, u, v = plan
+        h0 = sx * gx.take(i00) + sy * gy.take(i00)
+        h1 = sx * gx.take(i01) + (sy - 1) * gy.take(i01)
+        h2 = (sx - 1) * gx.take(i10) + sy * gy.take(i10)
+        h3 = (sx - 1) * gx.take(i11) + (sy - 1) * gy.take(i11)
+
+        l1 = h0 + u * (h2 - h0)
+        l2 = h1 + u * (h3 - h1)
+
+        return l1 + v * (l2 - l1)
+
+    def generate_batch(self, params, seeds):
+        if params["size"] < self.batch_min_size:
+            return super().generate_batch(params, seeds)
+        seeds = batch_seeds(params, seeds)
+        self.setup(params)
+        size = self.size
+        coords = np.arange(size, dtype=np.float64)
+        out = np.empty((len(seeds), size, size), dtype=np.float32)
+        rows = max(1, SAMPLE_CHUNK // size)
+        group = max(1, BATCH_BYTES // (size * size * 8))
+
+        for g0 in range(0, len(seeds), group):
+            chunk = seeds[g0:g0 + group]
+            tables = [self.seed_tables(seed) for seed in chunk]
+            totals = np.zeros((len(chunk), size, size))
+            with profiling.stage("batch", pixels=len(chunk) * size * size):
+                for r0 in range(0, size, rows):
+                    amplitude = self.persistance
+                    for i in range(self.octaves):
+                        plan = self.lattice_plan(coords[r0:r0 + rows], coords, i)
+                        for total, seed_tables in zip(totals, tables):
+                            self.plan_layer(plan, seed_tables, amplitude, total[r0:r0 + rows])
+                        amplitude *= 0.5
+            for k, seed in enumerate(chunk):
+                out[g0 + k] = self.make_field(totals[k], dict(params, seed=seed)).data
+        return out
 
-        if data_max > data_min:
-            noise_data = (noise_data - data_min) / (data_max - data_min)
-        u8noise_data = (noise_data * 255).astype(np.uint8)
-        self.data = np.stack((u8noise_data, u8noise_data, u8noise_data), axis=-1)
+    def generate(self, params):
+        self.data = self.generate_field(params).to_rgb8()
         return self.data
 
 
     def get_data(self):
         return self.data
+
+
+
+# Simplex noise on the same seeded permutation table and gradients as
+# PerlinNoiseGenerator. Each sample sums 3 corners of a triangle instead of
+# lerping 4 square corners, with no fade curve. Octaves, persistance and
+# the region API come from PerlinNoiseGenerator.
+class SimplexNoiseGenerator(PerlinNoiseGenerator):
+    F2 = 0.5 * (math.sqrt(3.0) - 1.0)
+    G2 = (3.0 - math.sqrt(3.0)) / 6.0
+    # brings one octave of unit gradient simplex noise to about [-1, 1]
+    scale = 99.0
+    # the shared lattice pays off at every size
+    batch_min_size = 0
+
+    def noise(self, x, y):
+        return float(self.noise_array(np.array([x]), np.array([y]))[0])
+
+    @staticmethod
+    def _corner(dx, dy, gx, gy):
+        t = 0.5 - dx * dx - dy * dy
+        np.maximum(t, 0.0, out=t)
+        t *= t
+        t *= t
+        return t * (dx * gx + dy * gy)
+
+    # exact is accepted for the octave loop of sample(), there is no fade to trade
+    def noise_array(self, x, y, exact=True):
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+
+        # skew to the simplex grid, find the cell and unskew its origin
+        s = (x + y) * self.F2
+        i = np.floor(x + s)
+        j = np.floor(y + s)
+        t = (i + j) * self.G2
+        x0 = x - i + t
+        y0 = y - j + t
+
+        # upper or lower triangle of the cell
+        upper = x0 > y0
+        i1 = upper.astype(np.intp)
+        j1 = 1 - i1
+
+        x1 = x0 - i1 + self.G2
+        y1 = y0 - j1 + self.G2
+        x2 = x0 + (2.0 * self.G2 - 1.0)
+        y2 = y0 + (2.0 * self.G2 - 1.0)
+
+        # & 255 is % 256 for negative cells too
+        ii = i.astype(np.intp) & 255
+        jj = j.astype(np.intp) & 255
+        table = self.table
+        # gradient components per table slot, one gather per corner and axis
+        gx = self.grads[table, 0]
+        gy = self.grads[table, 1]
+        h0 = table[ii] + jj
+        h1 = table[ii + i1] + jj + j1
+        h2 = table[ii + 1] + jj + 1
+
+        total = self._corner(x0, y0, gx[h0], gy[h0])
+        total += self._corner(x1, y1, gx[h1], gy[h1])
+        total += self._corner(x2, y2, gx[h2], gy[h2])
+        total *= self.scale
+        return total
+
+    # Every step of the kernel works on full 2D arrays, so rows are done in
+    # bands small enough for the temporaries to stay in cache
+    band_pixels = 32 * 1024
+
+    def octave_layer(self, xs, ys, octave):
+        out = np.empty((len(xs), len(ys)))
+        rows = max(1, self.band_pixels // max(len(ys), 1))
+        for r0 in range(0, len(xs), rows):
+            out[r0:r0 + rows] = super().octave_layer(xs[r0:r0 + rows], ys, octave)
+        return out
+
+    # Batch plans hold the skewed offsets, falloff weights and cells of the
+    # three corners, only the gradient lookups are left per seed. Same
+    # operations as noise_array, so slices match generate_field() exactly.
+
+    def lattice_plan(self, xs, ys, octave):
+        frequency = self.frequency(octave)
+        x = xs[:, None] * frequency
+        y = ys[None, :] * frequency
+
+        s = (x + y) * self.F2
+        i = np.floor(x + s)
+        j = np.floor(y + s)
+        t = (i + j) * self.G2
+        x0 = x - i + t
+        y0 = y - j + t
+
+        i1 = (x0 > y0).astype(np.intp)
+        j1 = 1 - i1
+
+        x1 = x0 - i1 + self.G2
+        y1 = y0 - j1 + self.G2
+        x2 = x0 + (2.0 * self.G2 - 1.0)
+        y2 = y0 + (2.0 * self.G2 - 1.0)
+
+        ii = i.astype(np.intp) & 255
+        jj = j.astype(np.intp) & 255
+        plan = []
+        for dx, dy, ci, cj in ((x0, y0, ii, jj), (x1, y1, ii + i1, jj + j1), (x2, y2, ii + 1, jj + 1)):
+            w = 0.5 - dx * dx - dy * dy
+            np.maximum(w, 0.0, out=w)
+            w *= w
+            w *= w
+            plan.append((dx, dy, w, ci, cj))
+        return plan
+
+    def seed_tables(self, seed):
+        other = type(self)()
+        other._generate_vectors(np.random.RandomState(seed))
+        table = other.table
+        return table, other.grads[table, 0], other.grads[table, 1]
+
+    def plan_layer(self, plan, tables, amplitude=1.0, out=None):
+        table, gx, gy = tables
+        total = None
+        for dx, dy, w, ci, cj in plan:
+            h = table[ci] + cj
+            corner = w * (dx * gx[h] + dy * gy[h])
+            if total is None:
+                total = corner
+            else:
+                total += corner
+        total *= self.scale
+        total *= amplitude
+        if out is None:
+            return total
+        out += total
+        return out
+
+    def sample_bound(self):
+        return abs(self.persistance) * (2.0 - 0.5 ** (self.octaves - 1))
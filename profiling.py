@@ -0,0 +1,167 @@
+import json
+import logging
+import threading
+import time
+import tracemalloc
+from collections import deque
+
+# Per-stage timing for renders.
+#
+#   with profiling.stage("normalize", pixels=data.size) as s:
+#       ...
+#       s.nbytes += out.nbytes
+#
+# While disabled stage() returns a shared no-op object, so the hooks cost a
+# global lookup and a call. enable() starts recording into a bounded list;
+# every record is also passed to listeners and, with log=True, logged as a
+# JSON line on the "noisegen.profile" logger.
+
+MAX_RECORDS = 10000
+
+logger = logging.getLogger("noisegen.profile")
+
+_enabled = False
+_trace_memory = False
+_log = False
+_records = deque(maxlen=MAX_RECORDS)
+_listeners = []
+_lock = threading.Lock()
+_count = 0
+
+
+class _NullStage:
+    nbytes = 0
+    pixels = 0
+
+    # callers may fill in nbytes/pixels, nothing to keep
+    def __setattr__(self, name, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    def __init__(self, name, pixels, nbytes):
+        self.name = name
+        self.pixels = pixels
+        self.nbytes = nbytes
+
+    def __enter__(self):
+        if _trace_memory:
+            tracemalloc.reset_peak()
+            self.mem_start = tracemalloc.get_traced_memory()[0]
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record = {
+            "stage": self.name,
+            "seconds": time.perf_counter() - self.start,
+            "pixels": self.pixels,
+            "bytes": self.nbytes,
+            "thread": threading.current_thread().name,
+            "time": time.time(),
+        }
+        if _trace_memory:
+            record["peak_bytes"] = tracemalloc.get_traced_memory()[1] - self.mem_start
+        _emit(record)
+        return False
+
+
+def stage(name, pixels=0, nbytes=0):
+    if not _enabled:
+        return NULL_STAGE
+    return _Stage(name, pixels, nbytes)
+
+
+def _emit(record):
+    global _count
+    with _lock:
+        _records.append(record)
+        _count += 1
+        listeners = list(_listeners)
+    for listener in listeners:
+        listener(record)
+    if _log:
+        logger.info(json.dumps(record))
+
+
+def enable(trace_memory=False, log=False):
+    """trace_memory adds the tracemalloc peak of each stage, which is slow."""
+    global _enabled, _trace_memory, _log
+    _trace_memory = trace_memory
+    _log = log
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+    if _trace_memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def is_enabled():
+    return _enabled
+
+
+def add_listener(fn):
+    _listeners.append(fn)
+
+
+def remove_listener(fn):
+    _listeners.remove(fn)
+
+
+# mark() and records_since(mark) give the records of one render
+def mark():
+    return _count
+
+
+def records_since(mark_value):
+    with _lock:
+        new = _count - mark_value
+        return list(_records)[-new:] if new > 0 else []
+
+
+def records():
+    with _lock:
+        return list(_records)
+
+
+def clear():
+    with _lock:
+        _records.clear()
+
+
+def summarize(stage_records):
+    """Totals per stage name, in first seen order."""
+    totals = {}
+    for r in stage_records:
+        total = totals.setdefault(r["stage"], {"seconds": 0.0, "pixels": 0, "bytes": 0, "calls": 0})
+        total["seconds"] += r["seconds"]
+        total["pixels"] += r["pixels"]
+        total["bytes"] += r["bytes"]
+        total["calls"] += 1
+        if "peak_bytes" in r:
+            total["peak_bytes"] = max(total.get("peak_bytes", 0), r["peak_bytes"])
+    return totals
+
+
+def format_summary(totals):
+    return "  ".join(f"{name} {t['seconds'] * 1000:.1f} ms" for name, t in totals.items())
+
+
+def dump(path, stage_records=None):
+    stage_records = records() if stage_records is None else stage_records
+    with open(path, "w") as f:
+        json.dump({"records": stage_records, "summary": summarize(stage_records)}, f, indent=1)
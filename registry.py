@@ -1,23 +1,71 @@
-from generators import SolidColorGenerator, CheckerboardGenerator, GradientGenerator
-from noises import WorleyNoiseGenerator, WhiteNoiseGenerator, PerlinNoiseGenerator
+from collections.abc import Mapping
+from importlib import import_module
+
+
+# Name -> class map where classes are given as "module.ClassName" and only
+# imported on first lookup, so importing the registry stays cheap for
+# headless jobs and pool workers that only use one generator.
+class LazyRegistry(Mapping):
+    def __init__(self, paths, kind="entry"):
+        self._paths = dict(paths)
+        self._loaded = {}
+        self.kind = kind
+
+    def __getitem__(self, name):
+        if name not in self._loaded:
+            module_name, _, cls_name = self._paths[name].rpartition(".")
+            self._loaded[name] = getattr(import_module(module_name), cls_name)
+        return self._loaded[name]
+
+    def __iter__(self):
+        return iter(self._paths)
+
+    def __len__(self):
+        return len(self._paths)
+
+    def __contains__(self, name):
+        return name in self._paths
+
+    def create(self, name):
+        if name not in self._paths:
+            raise ValueError(f"Unknown {self.kind} '{name}', expected one of {list(self._paths)}")
+        return self[name]()
+
+
+
+# One instance per name, created on first use and kept, so layer caches and
+# other per-instance state survive between renders.
+class Instances:
+    def __init__(self, registry):
+        self.registry = registry
+        self._instances = {}
+
+    def __getitem__(self, name):
+        if name not in self._instances:
+            self._instances[name] = self.registry.create(name)
+        return self._instances[name]
+
+
+def default_params(instance):
+    return {name: desc["default"] for name, desc in instance.get_ui_schema().items()}
 
-from modifiers import NoModifier, BrightnessModifier, OneMinus, PowerOfX
 
 # Maps for active(usable) generator and modifiers
 # Used in NoiseGenApp
 
-GENERATORS = {
-    "Solid Color":  SolidColorGenerator,
-    "Checkerboard": CheckerboardGenerator,
-    "Gradient":     GradientGenerator,
-    "WhiteNoise":   WhiteNoiseGenerator,
-    "WorleyNoise":  WorleyNoiseGenerator,
-    "PerlinNoise":  PerlinNoiseGenerator,
-}
-
-MODIFIERS = {
-    "None":       NoModifier,
-    "Brightness": BrightnessModifier,
-    "OneMinus":   OneMinus,
-    "PowerOfX":   PowerOfX,
-}
\ No newline at end of file
+GENERATORS = LazyRegistry({
+    "Solid Color":  "generators.SolidColorGenerator",
+    "Checkerboard": "generators.CheckerboardGenerator",
+    "Gradient":     "generators.GradientGenerator",
+    "WhiteNoise":   "noises.WhiteNoiseGenerator",
+    "WorleyNoise":  "noises.WorleyNoiseGenerator",
+    "PerlinNoise":  "noises.PerlinNoiseGenerator",
+    "SimplexNoise": "noises.SimplexNoiseGenerator",
+}, kind="generator")
+
+MODIFIERS = LazyRegistry({
+    "None":       "modifiers.NoModifier",
+    "Brightness": "modifiers.BrightnessModifier",
+    "OneMinus":   "modifiers.OneMinus",
+    "PowerOfX":   "modifiers.PowerOfX",
+}, kind="modifier")
@@ -0,0 +1,227 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from base import supports_regions
+
+# Tiled rendering for textures that don't fit in memory.
+# The generator is evaluated tile by tile through its region API
+# (setup/evaluate, see base.py) straight into a .npy memmap, so peak memory
+# depends on tile_size and not on the image size.
+#
+# With workers > 1 tiles are spread over a process pool. Every worker sets
+# up its own copy of the generator from the same params and writes its tiles
+# into the shared memmap directly, so nothing is copied back to the parent
+# and the result is bit-identical to the single-process render.
+#
+# Normalized generators are rescaled like field.normalize does it: raw
+# float64 values go to a scratch .npy next to path first, then every tile is
+# rescaled in float64 and stored in the output dtype, so a float32 tiled
+# render equals generate_field(params).data.
+
+TILE_SIZE = 1024
+BAND_ROWS = 64
+PREVIEW_SIZE = 128
+
+
+class RenderCancelled(Exception):
+    pass
+
+
+def evaluate_bands(generator, xs, ys, band_rows=BAND_ROWS, progress=None, cancelled=None):
+    """
+    generator.evaluate(xs, ys) split into bands of rows. progress(pixels) is
+    called after every band, RenderCancelled is raised between bands once
+    cancelled() returns True.
+    """
+    bands = []
+    for r0 in range(0, len(xs), band_rows):
+        if cancelled is not None and cancelled():
+            raise RenderCancelled
+        band = generator.evaluate(xs[r0:r0 + band_rows], ys)
+        bands.append(band)
+        if progress is not None:
+            progress(band.shape[0] * band.shape[1])
+    return np.concatenate(bands)
+
+
+class _Progress:
+    def __init__(self, total, callback):
+        self.done = 0
+        self.total = total
+        self.callback = callback
+
+    def __call__(self, pixels):
+        self.done += pixels
+        if self.callback is not None:
+            self.callback(self.done, self.total)
+
+
+def render_bands(generator, params, band_rows=BAND_ROWS, progress=None, cancelled=None):
+    """
+    Same field as generator.generate_field(params), evaluated in bands of
+    rows. progress(done_pixels, total_pixels) is called after every band,
+    and the render stops with RenderCancelled once cancelled() returns True.
+    """
+    if not supports_regions(generator):
+        return generator.generate_field(params)
+
+    generator.setup(params)
+    size = params["size"]
+    coords = np.arange(size, dtype=np.float64)
+    data = evaluate_bands(generator, coords, coords, band_rows, _Progress(size * size, progress), cancelled)
+    return generator.make_field(data, params)
+
+
+def render_progressive(generator, params, preview_size=PREVIEW_SIZE, band_rows=BAND_ROWS,
+                       progress=None, cancelled=None):
+    """
+    Yields (stride, field) from a coarse preview up to the full image.
+    Every level samples the full-size field at every stride-th pixel, the
+    first one is at most preview_size wide and each next level halves the
+    stride. Points shared with the previous level are reused, so the whole
+    sequence costs the same as one full render. The last level (stride 1)
+    is identical to generator.generate_field(params).
+    """
+    if not supports_regions(generator):
+        yield 1, generator.generate_field(params)
+        return
+
+    generator.setup(params)
+    size = params["size"]
+    coords = np.arange(size, dtype=np.float64)
+    tracker = _Progress(size * size, progress)
+
+    stride = 1
+    while -(-size // stride) > preview_size:
+        stride *= 2
+
+    data = None
+    while stride >= 1:
+        xs = coords[::stride]
+        if data is None:
+            data = evaluate_bands(generator, xs, xs, band_rows, tracker, cancelled)
+        else:
+            # previous level is every other row and column of this one
+            level = np.empty((len(xs), len(xs)) + data.shape[2:], dtype=data.dtype)
+            level[::2, ::2] = data
+            level[1::2, :] = evaluate_bands(generator, xs[1::2], xs, band_rows, tracker, cancelled)
+            level[::2, 1::2] = evaluate_bands(generator, xs[::2], xs[1::2], band_rows, tracker, cancelled)
+            data = level
+        yield stride, generator.make_field(data, params)
+        stride //= 2
+
+
+def iter_tiles(size, tile_size=TILE_SIZE):
+    for r0 in range(0, size, tile_size):
+        for c0 in range(0, size, tile_size):
+            yield r0, c0, min(tile_size, size - r0), min(tile_size, size - c0)
+
+
+def render_tile(generator, out, r0, c0, h, w):
+    coords_r = np.arange(r0, r0 + h, dtype=np.float64)
+    coords_c = np.arange(c0, c0 + w, dtype=np.float64)
+    tile = generator.evaluate(coords_r, coords_c)
+    out[r0:r0 + h, c0:c0 + w] = tile
+    return float(tile.min()), float(tile.max())
+
+
+def normalize_tile(raw, out, r0, c0, h, w, data_min, data_max):
+    tile = raw[r0:r0 + h, c0:c0 + w]
+    if data_max > data_min:
+        tile = (tile - data_min) / (data_max - data_min)
+    out[r0:r0 + h, c0:c0 + w] = tile
+
+
+def normalize_tiles(raw, out, data_min, data_max, tile_size=TILE_SIZE):
+    for r0, c0, h, w in iter_tiles(out.shape[0], tile_size):
+        normalize_tile(raw, out, r0, c0, h, w, data_min, data_max)
+
+
+# Per-process state for pool workers
+_worker = {}
+
+
+def _init_worker(generator_cls, params, path, raw_path):
+    generator = generator_cls()
+    generator.use_cache = False
+    generator.setup(params)
+    _worker["generator"] = generator
+    _worker["out"] = np.load(path, mmap_mode="r+")
+    _worker["raw"] = np.load(raw_path, mmap_mode="r+") if raw_path != path else _worker["out"]
+
+
+def _render_worker(r0, c0, h, w):
+    return render_tile(_worker["generator"], _worker["raw"], r0, c0, h, w)
+
+
+def _normalize_worker(r0, c0, h, w, data_min, data_max):
+    normalize_tile(_worker["raw"], _worker["out"], r0, c0, h, w, data_min, data_max)
+
+
+def render_tiled(generator, params, path, tile_size=TILE_SIZE, dtype=np.float32, workers=1):
+    """
+    Render generator into a .npy file at path and return it as a memmap.
+    Values are in [0, 1], shape is (size, size) or (size, size, 3) for
+    colored output. Any size works here, the UI size list doesn't apply.
+    workers=None uses every core. Layer caches are skipped, every tile is
+    evaluated once. Normalized generators need a float64 scratch file of
+    the full size next to path while rendering.
+    """
+    if not supports_regions(generator):
+        raise ValueError(f"{type(generator).__name__} can't be rendered in tiles")
+    use_cache = generator.use_cache
+    generator.use_cache = False
+    try:
+        return _render_tiled(generator, params, path, tile_size, dtype, workers)
+    finally:
+        generator.use_cache = use_cache
+
+
+def _render_tiled(generator, params, path, tile_size, dtype, workers):
+    generator.setup(params)
+    size = params["size"]
+
+    probe = generator.evaluate(np.zeros(1), np.zeros(1))
+    shape = (size, size) + probe.shape[2:]
+    out = np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=shape)
+    raw_path = path + ".raw.npy" if generator.normalized else path
+    try:
+        raw = out
+        if raw_path != path:
+            raw = np.lib.format.open_memmap(raw_path, mode="w+", dtype=np.float64, shape=shape)
+        _render_passes(generator, params, path, raw_path, out, raw, tile_size, workers)
+        del raw
+    finally:
+        if raw_path != path and os.path.exists(raw_path):
+            os.remove(raw_path)
+    out.flush()
+    return out
+
+
+def _render_passes(generator, params, path, raw_path, out, raw, tile_size, workers):
+    tiles = list(iter_tiles(out.shape[0], tile_size))
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(tiles))
+
+    # Pass 1: raw values and their global range
+    # Pass 2: rescale into out, one tile at a time
+    if workers <= 1:
+        ranges = [render_tile(generator, raw, *tile) for tile in tiles]
+        if raw is not out:
+            data_min = min(r[0] for r in ranges)
+            data_max = max(r[1] for r in ranges)
+            normalize_tiles(raw, out, data_min, data_max, tile_size)
+    else:
+        out.flush()
+        raw.flush()
+        initargs = (type(generator), params, path, raw_path)
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=initargs) as pool:
+            ranges = list(pool.map(_render_worker, *zip(*tiles)))
+            if raw is not out:
+                data_min = min(r[0] for r in ranges)
+                data_max = max(r[1] for r in ranges)
+                n = len(tiles)
+                list(pool.map(_normalize_worker, *zip(*tiles), [data_min] * n, [data_max] * n))
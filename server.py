@@ -0,0 +1,272 @@
+import argparse
+import io
+import json
+import os
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.request import Request, urlopen
+
+import numpy as np
+
+from registry import GENERATORS, MODIFIERS, default_params
+from cache import LayerCache, ResultCache
+from field import NoiseField
+from noisegen import BatchRenderer
+
+################
+#
+#  Local render service, listens on 127.0.0.1 only.
+#
+#    python server.py --port 8765 --workers 4 --cache-dir ~/.cache/noisegen
+#
+#  POST /render with a noisegen job (no output needed):
+#    {"generator": "PerlinNoise", "params": {"seed": 7}, "modifiers": [{"name": "OneMinus"}],
+#     "format": "npy" | "png" | "r16" | "r32" | "npz", "bit_depth": 16, "compress_level": 1}
+#  answers with the encoded texture, X-Cache tells hit, shared (joined a
+#  render already in flight) or miss.
+#  GET /generators lists generators and modifiers with their schemas,
+#  GET /stats the cache counters.
+#
+#  Renders run on a pool of worker processes that are started with the
+#  server and keep their generator instances (and their layer caches)
+#  between jobs. Identical requests in flight share one render, results
+#  go to a ResultCache that --cache-dir also keeps on disk, the same
+#  directory noisegen --cache-dir and the GUI use.
+#
+################
+
+DEFAULT_PORT = 8765
+# Encoded responses kept next to the field cache, so repeats skip encoding
+ENCODED_CACHE_BYTES = 128 * 1024 * 1024
+CONTENT_TYPES = {"npy": "application/octet-stream", "png": "image/png",
+                 "r16": "application/octet-stream", "r32": "application/octet-stream",
+                 "npz": "application/octet-stream"}
+
+
+# Per-process state for pool workers
+_worker = {}
+
+
+def _init_worker():
+    # fields are cached by the server, workers only keep their instances
+    _worker["renderer"] = BatchRenderer(ResultCache(max_bytes=0))
+    for name in GENERATORS:
+        GENERATORS[name]
+    for name in MODIFIERS:
+        MODIFIERS[name]
+
+
+def _render_worker(job):
+    return _worker["renderer"].render(job)
+
+
+def _warm_worker(_):
+    return os.getpid()
+
+
+def encode(field, fmt="npy", bit_depth=None, compress_level=None):
+    from export import DEFAULT_COMPRESS_LEVEL, write_mips, write_png, write_raw
+
+    buf = io.BytesIO()
+    if fmt == "npy":
+        np.save(buf, field.data)
+    elif fmt == "png":
+        level = DEFAULT_COMPRESS_LEVEL if compress_level is None else compress_level
+        write_png(field, buf, bit_depth or 8, level)
+    elif fmt in ("r16", "r32"):
+        write_raw(field, buf, 16 if fmt == "r16" else 32)
+    elif fmt == "npz":
+        write_mips(field, buf, compress_level=compress_level or 0)
+    else:
+        raise ValueError(f"Unknown format '{fmt}', expected one of {list(CONTENT_TYPES)}")
+    return buf.getvalue()
+
+
+
+class RenderService:
+    def __init__(self, workers=None, cache=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.cache = cache if cache is not None else ResultCache()
+        self.encoded = LayerCache(ENCODED_CACHE_BYTES)
+        self.pool = ProcessPoolExecutor(self.workers, initializer=_init_worker)
+        # start every worker now instead of on the first requests
+        list(self.pool.map(_warm_worker, range(self.workers)))
+        self.inflight = {}
+        self.shared = 0
+        self._lock = threading.Lock()
+
+    def normalize_job(self, job):
+        """Job with full params, so equal renders get equal cache keys."""
+        name = job.get("generator")
+        params = default_params(GENERATORS.create(name))
+        params.update(job.get("params", {}))
+        modifiers = []
+        for mod in job.get("modifiers", []):
+            mod_params = default_params(MODIFIERS.create(mod["name"]))
+            mod_params.update(mod.get("params", {}))
+            modifiers.append({"name": mod["name"], "params": mod_params})
+        return {"generator": name, "params": params, "modifiers": modifiers}
+
+    # Plain generator output shares its key with the GUI and noisegen
+    @staticmethod
+    def cache_entry(job):
+        if not job["modifiers"]:
+            return job["generator"], job["params"]
+        return job["generator"], {"params": job["params"], "modifiers": job["modifiers"]}
+
+    def render(self, job):
+        """(field, "hit" | "shared" | "miss") for a job as accepted by normalize_job."""
+        return self._render(self.normalize_job(job))
+
+    def _render(self, job):
+        name, params = self.cache_entry(job)
+        field = self.cache.get(name, params)
+        if field is not None:
+            return field, "hit"
+
+        key = ResultCache.make_key(name, params)
+        with self._lock:
+            future = self.inflight.get(key)
+            if future is not None:
+                self.shared += 1
+                status = "shared"
+            else:
+                # a render may have finished since the lookup above
+                field = self.cache.get(name, params)
+                if field is not None:
+                    return field, "hit"
+                future = self.pool.submit(_render_worker, job)
+                self.inflight[key] = future
+                status = "miss"
+        # outside the lock: a future that is already done runs the callback
+        # right here, and _finished takes the lock
+        if status == "miss":
+            future.add_done_callback(lambda f: self._finished(key, name, params, f))
+        return future.result(), status
+
+    def _finished(self, key, name, params, future):
+        # cached before leaving inflight, so no request renders it twice
+        if future.exception() is None:
+            self.cache.put(name, params, future.result())
+        with self._lock:
+            self.inflight.pop(key, None)
+
+    def render_encoded(self, job, fmt="npy", bit_depth=None, compress_level=None):
+        job = self.normalize_job(job)
+        field, status = self._render(job)
+        name, params = self.cache_entry(job)
+        key = (ResultCache.make_key(name, params), fmt, bit_depth, compress_level)
+        payload = self.encoded.get(key)
+        if payload is None:
+            payload = self.encoded.put(key, np.frombuffer(encode(field, fmt, bit_depth, compress_level), np.uint8))
+        return payload, field, status
+
+    def stats(self):
+        with self._lock:
+            inflight = len(self.inflight)
+        return {"workers": self.workers, "inflight": inflight, "shared": self.shared,
+                "hits": self.cache.hits, "misses": self.cache.misses,
+                "cached": len(self.cache), "cached_bytes": self.cache.nbytes}
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+
+
+
+class RenderHandler(BaseHTTPRequestHandler):
+    def send_json(self, code, data):
+        body = json.dumps(data, default=list).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/generators":
+            schemas = {
+                "generators": {name: GENERATORS[name]().get_ui_schema() for name in GENERATORS},
+                "modifiers": {name: MODIFIERS[name]().get_ui_schema() for name in MODIFIERS},
+            }
+            self.send_json(200, schemas)
+        elif self.path == "/stats":
+            self.send_json(200, self.server.service.stats())
+        else:
+            self.send_json(404, {"error": f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        if self.path != "/render":
+            self.send_json(404, {"error": f"Unknown path {self.path}"})
+            return
+        try:
+            job = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            fmt = job.get("format", "npy")
+            if fmt not in CONTENT_TYPES:
+                raise ValueError(f"Unknown format '{fmt}', expected one of {list(CONTENT_TYPES)}")
+            payload, field, status = self.server.service.render_encoded(
+                job, fmt, job.get("bit_depth"), job.get("compress_level"))
+        except (KeyError, ValueError, TypeError) as e:
+            self.send_json(400, {"error": str(e)})
+            return
+        except Exception as e:
+            self.send_json(500, {"error": str(e)})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPES[fmt])
+        self.send_header("Content-Length", str(payload.nbytes))
+        self.send_header("X-Cache", status)
+        self.send_header("X-Shape", ",".join(str(n) for n in field.data.shape))
+        self.end_headers()
+        self.wfile.write(payload.data)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def make_server(service, port=DEFAULT_PORT, host="127.0.0.1", verbose=False):
+    server = ThreadingHTTPServer((host, port), RenderHandler)
+    server.daemon_threads = True
+    server.service = service
+    server.verbose = verbose
+    return server
+
+
+def render_remote(job, url=f"http://127.0.0.1:{DEFAULT_PORT}", timeout=None) -> NoiseField:
+    """Client side: render job on a running server and return the field."""
+    job = dict(job, format="npy")
+    request = Request(url + "/render", json.dumps(job).encode(), {"Content-Type": "application/json"})
+    with urlopen(request, timeout=timeout) as response:
+        data = np.load(io.BytesIO(response.read()))
+    return NoiseField(data, job["generator"], job.get("params"))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local noise render server")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=None, help="worker processes, default every core")
+    parser.add_argument("--cache-dir", help="keep rendered results in this directory between runs")
+    parser.add_argument("--max-cache-mb", type=int, default=512, help="in-memory result cache size")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args(argv)
+
+    cache = ResultCache(args.max_cache_mb * 1024 * 1024, disk_dir=args.cache_dir)
+    service = RenderService(args.workers, cache)
+    server = make_server(service, args.port, verbose=args.verbose)
+    print(f"Serving on http://127.0.0.1:{args.port} with {service.workers} workers")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+    return 0
+
+
+
+if __name__ == "__main__":
+    sys.exit(main())
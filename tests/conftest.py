@@ -0,0 +1,25 @@
+import os
+import sys
+
+import pytest
+
+# The modules are flat files at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from registry import GENERATORS, default_params  # noqa: E402
+
+# Small and odd sizes, the fast paths are meant to give the same bits as
+# the plain ones on both.
+SIZES = (64, 300)
+NOISES = ("WhiteNoise", "WorleyNoise", "PerlinNoise", "SimplexNoise")
+
+
+def make(name, size, **params):
+    """New generator instance and its default params at size."""
+    generator = GENERATORS[name]()
+    return generator, dict(default_params(generator), size=size, **params)
+
+
+@pytest.fixture(params=SIZES)
+def size(request):
+    return request.param
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from conftest import NOISES, make
+from noisegen import BatchRenderer
+from registry import GENERATORS
+
+
+# 48 is below every batch_min_size, so that goes through the per-seed loop
+@pytest.mark.parametrize("size", [48, 64, 300])
+@pytest.mark.parametrize("name", NOISES)
+def test_batch_matches_fields(name, size):
+    generator, params = make(name, size)
+    seeds = [3, 4, 11]
+    batch = generator.generate_batch(params, seeds)
+    assert batch.shape[0] == 3 and batch.dtype == np.float32
+    for data, seed in zip(batch, seeds):
+        assert np.array_equal(data, GENERATORS[name]().generate_field(dict(params, seed=seed)).data)
+
+
+def test_batch_seeds_as_param_sets():
+    generator, params = make("WorleyNoise", 64)
+    batch = generator.generate_batch(params, [{"seed": 1}, {"seed": 2}])
+    assert np.array_equal(batch, generator.generate_batch(params, [1, 2]))
+    with pytest.raises(ValueError):
+        generator.generate_batch(params, [{"seed": 1, "grid_size": 3}])
+
+
+def test_run_batch_outputs(tmp_path):
+    renderer = BatchRenderer()
+    job = {"generator": "PerlinNoise", "params": {"size": 64}, "modifiers": [{"name": "OneMinus"}],
+           "seeds": [{"seed": 1}, {"seed": 2}]}
+    renderer.run(dict(job, output=str(tmp_path / "v_{}.png")))
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["v_1.png", "v_2.png"]
+
+    renderer.run(dict(job, output=str(tmp_path / "v.npy")))
+    stack = np.load(tmp_path / "v.npy")
+    for data, seed in zip(stack, (1, 2)):
+        assert np.array_equal(data, renderer.render(dict(job, params={"size": 64, "seed": seed})).data)
+
+
+def test_run_batch_needs_a_pattern(tmp_path):
+    job = {"generator": "PerlinNoise", "params": {"size": 64}, "seeds": [1, 2], "output": str(tmp_path / "v.png")}
+    with pytest.raises(ValueError, match="needs a {}"):
+        BatchRenderer().run(job)
+    assert list(tmp_path.iterdir()) == []
+    BatchRenderer().run(dict(job, seeds=[5]))
+    assert [p.name for p in tmp_path.iterdir()] == ["v.png"]
@@ -0,0 +1,20 @@
+from benchmark import compare, measure
+
+
+def case(key, seconds):
+    return {"key": key, "seconds": seconds}
+
+
+def test_compare_ignores_timer_noise():
+    baseline = {"results": [case("fast", 20e-6), case("slow", 0.010), case("same", 0.010)]}
+    results = [case("fast", 60e-6), case("slow", 0.020), case("same", 0.011), case("new", 1.0)]
+    assert [r["key"] for r in compare(results, baseline, 0.25)] == ["slow"]
+    assert results[0]["baseline_ratio"] == 3.0
+    assert "baseline_ratio" not in results[3]
+
+
+def test_fast_cases_repeat():
+    calls = []
+    measure(lambda: calls.append(1), 3)
+    # FAST_REPEAT runs, then one traced run
+    assert len(calls) > 3
@@ -0,0 +1,107 @@
+import numpy as np
+import pytest
+
+from cache import LayerCache, ResultCache
+from conftest import make
+from field import NoiseField
+from registry import GENERATORS
+
+
+def field(value, size=16):
+    return NoiseField(np.full((size, size), value, dtype=np.float32), "Test", {"value": value})
+
+
+def test_lru_eviction():
+    cache = ResultCache(max_bytes=3 * field(0).nbytes)
+    for i in range(3):
+        cache.put("Test", {"seed": i}, field(i))
+    cache.get("Test", {"seed": 0})
+    cache.put("Test", {"seed": 3}, field(3))
+    assert len(cache) == 3 and cache.nbytes == 3 * field(0).nbytes
+    assert cache.get("Test", {"seed": 1}) is None
+    assert cache.get("Test", {"seed": 0}).data[0, 0] == 0
+    assert (cache.hits, cache.misses) == (2, 1)
+
+
+def test_entries_are_frozen():
+    cache = ResultCache()
+    cached = cache.put("Test", {}, field(1))
+    with pytest.raises(ValueError):
+        cached.data[0, 0] = 0
+
+
+def test_oversized_entry_is_not_kept():
+    cache = ResultCache(max_bytes=field(0).nbytes - 1)
+    cache.put("Test", {}, field(0))
+    assert len(cache) == 0 and cache.get("Test", {}) is None
+
+
+def test_disk_tier(tmp_path):
+    first = ResultCache(max_bytes=0, disk_dir=str(tmp_path))
+    first.put("Test", {"seed": 1}, field(0.25))
+    second = ResultCache(disk_dir=str(tmp_path))
+    loaded = second.get("Test", {"seed": 1})
+    assert loaded.data[0, 0] == np.float32(0.25) and loaded.params == {"value": 0.25}
+    assert second.hits == 1 and len(second) == 1
+    assert second.get("Test", {"seed": 2}) is None
+    assert not any(p.suffix == ".tmp" for p in tmp_path.iterdir())
+
+
+def test_keys():
+    key = ResultCache.make_key
+    assert key("A", {"x": 1, "y": 0.5}) == key("A", {"y": 0.5, "x": 1.0})
+    assert key("A", {"seed": np.int64(7)}) == key("A", {"seed": 7})
+    assert key("A", {"seed": 2**53}) != key("A", {"seed": 2**53 + 1})
+    assert key("A", {"x": 0.1}) != key("A", {"x": 0.1 + 1e-12})
+    assert key("A", {"tileable": True}) != key("A", {"tileable": 1})
+    assert key("A", {}) != key("B", {})
+
+
+def test_large_seeds_get_their_own_entry():
+    cache = ResultCache()
+    cache.put("Test", {"seed": 2**60}, field(0))
+    assert cache.get("Test", {"seed": 2**60 + 1}) is None
+
+
+
+def test_layer_cache_reserve():
+    layer = np.zeros(1024)
+    cache = LayerCache(max_bytes=2 * layer.nbytes, max_reserve=8 * layer.nbytes)
+    for i in range(3):
+        cache.put(i, layer.copy())
+    assert len(cache) == 2
+    cache.reserve(100 * layer.nbytes)
+    assert cache.max_bytes == 8 * layer.nbytes
+    cache.reserve(0)
+    assert cache.max_bytes == 2 * layer.nbytes
+
+
+@pytest.mark.parametrize("name", ["PerlinNoise", "SimplexNoise"])
+def test_octave_layers(name, size):
+    generator, params = make(name, size)
+    first = generator.generate_field(params).data
+    hits = generator.layer_cache.hits
+    # a different persistence reuses every cached octave
+    reweighted = generator.generate_field(dict(params, persistance=0.5)).data
+    assert generator.layer_cache.hits == hits + params["octaves"]
+    uncached = GENERATORS[name]()
+    uncached.use_cache = False
+    assert np.array_equal(first, generator.generate_field(params).data)
+    assert np.array_equal(first, uncached.generate_field(params).data)
+    assert np.array_equal(reweighted, uncached.generate_field(dict(params, persistance=0.5)).data)
+
+
+def test_distance_fields(size):
+    generator, params = make("WorleyNoise", size, mode="F1")
+    first = generator.generate_field(params).data
+    hits = generator.distance_cache.hits
+    remoded = generator.generate_field(dict(params, mode="F2 - F1")).data
+    assert generator.distance_cache.hits == hits + 1
+    assert np.array_equal(first, generator.generate_field(params).data)
+    uncached = GENERATORS["WorleyNoise"]()
+    uncached.use_cache = False
+    entries = len(uncached.distance_cache)
+    assert np.array_equal(first, uncached.generate_field(params).data)
+    assert np.array_equal(remoded, uncached.generate_field(dict(params, mode="F2 - F1")).data)
+    # the cache is shared by the class, uncached renders leave it alone
+    assert len(uncached.distance_cache) == entries
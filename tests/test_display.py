@@ -0,0 +1,27 @@
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip("PyQt6")
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from field import NoiseField  # noqa: E402
+from main import field_to_qimage  # noqa: E402
+
+
+def pixels(image, buffer):
+    ptr = image.constBits()
+    ptr.setsize(image.sizeInBytes())
+    return np.frombuffer(ptr, np.uint8).reshape(buffer.shape[0], -1)
+
+
+@pytest.mark.parametrize("shape", [(64, 48), (33, 17, 3)])
+def test_qimage_wraps_buffer(shape):
+    field = NoiseField(np.random.default_rng(0).random(shape, dtype=np.float32))
+    image, buffer = field_to_qimage(field)
+    assert (image.width(), image.height()) == (shape[1], shape[0])
+    # the image reads the buffer itself, no copy in between
+    assert int(image.constBits()) == buffer.ctypes.data
+    expected = field.to_gray8() if len(shape) == 2 else field.to_rgb8()
+    assert np.array_equal(pixels(image, buffer)[:, :expected[0].size], expected.reshape(shape[0], -1))
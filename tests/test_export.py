@@ -0,0 +1,93 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from export import export, write_png, write_raw
+from field import NoiseField
+from render import RenderCancelled
+
+# taller than EXPORT_ROWS, so files are written in several bands
+SHAPES = [(300, 70), (300, 70, 3)]
+
+
+def field(shape, seed=0):
+    data = np.random.default_rng(seed).random(shape, dtype=np.float32)
+    # values outside [0, 1] are clipped on export
+    data[0, 0] = -0.5
+    data[0, 1] = 1.5
+    return NoiseField(data)
+
+
+def expected(data, bit_depth):
+    data = np.clip(data, 0.0, 1.0)
+    return (data * 65535).astype(np.uint16) if bit_depth == 16 else (data * 255).astype(np.uint8)
+
+
+@pytest.mark.parametrize("level", [0, 6, 9])
+@pytest.mark.parametrize("shape", SHAPES)
+def test_png8(shape, level):
+    source = field(shape)
+    buf = io.BytesIO()
+    write_png(source, buf, 8, level)
+    image = Image.open(io.BytesIO(buf.getvalue()))
+    assert image.mode == ("L" if len(shape) == 2 else "RGB")
+    assert np.array_equal(np.asarray(image), expected(source.data, 8))
+
+
+def test_png16_gray():
+    source = field(SHAPES[0])
+    buf = io.BytesIO()
+    write_png(source, buf, 16)
+    image = Image.open(io.BytesIO(buf.getvalue()))
+    assert image.mode == "I;16"
+    assert np.array_equal(np.asarray(image), expected(source.data, 16))
+
+
+def test_png16_rgb():
+    source = field(SHAPES[1])
+    buf = io.BytesIO()
+    write_png(source, buf, 16)
+    image = Image.open(io.BytesIO(buf.getvalue()))
+    # PIL reads 48-bit RGB as its 8-bit high bytes
+    assert image.mode == "RGB"
+    assert np.array_equal(np.asarray(image), (expected(source.data, 16) >> 8).astype(np.uint8))
+
+
+@pytest.mark.parametrize("shape", SHAPES)
+def test_raw(shape, tmp_path):
+    source = field(shape)
+    gray = np.clip(source.data, 0.0, 1.0)
+    if gray.ndim == 3:
+        gray = gray.mean(axis=-1)
+    export(source, str(tmp_path / "h.r16"))
+    export(source, str(tmp_path / "h.r32"))
+    assert np.array_equal(np.fromfile(tmp_path / "h.r16", "<u2").reshape(gray.shape), expected(gray, 16))
+    assert np.array_equal(np.fromfile(tmp_path / "h.r32", "<f4").reshape(gray.shape), gray)
+
+
+def test_npy_from_memmap(tmp_path):
+    source = np.lib.format.open_memmap(str(tmp_path / "src.npy"), mode="w+", dtype=np.float32, shape=(300, 70))
+    source[:] = field((300, 70)).data
+    export(source, str(tmp_path / "out.npy"))
+    assert np.array_equal(np.load(tmp_path / "out.npy"), np.clip(source, 0.0, 1.0))
+
+
+def test_other_formats_go_through_pil(tmp_path):
+    source = field(SHAPES[1])
+    export(source, str(tmp_path / "f.bmp"))
+    assert np.array_equal(np.asarray(Image.open(tmp_path / "f.bmp")), source.to_rgb8())
+
+
+@pytest.mark.parametrize("name", ["f.png", "f.npy", "f.r16"])
+def test_cancel_leaves_no_file(name, tmp_path):
+    with pytest.raises(RenderCancelled):
+        export(field(SHAPES[0]), str(tmp_path / name), cancelled=lambda: True)
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_progress(tmp_path):
+    calls = []
+    export(field(SHAPES[0]), str(tmp_path / "f.png"), progress=lambda done, total: calls.append((done, total)))
+    assert calls == [(256, 300), (300, 300)]
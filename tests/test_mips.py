@@ -0,0 +1,80 @@
+import io
+
+import numpy as np
+import pytest
+
+from cache import ResultCache
+from conftest import make
+from export import write_mips
+from field import NoiseField, downsample, mip_chain, mip_count
+from modifiers import ModifierStack, OneMinus
+from noisegen import BatchRenderer
+
+
+def test_chain_shapes():
+    data = np.random.default_rng(0).random((300, 300), dtype=np.float32)
+    chain = mip_chain(data)
+    assert len(chain) == mip_count(data.shape) == 10
+    assert [level.shape[0] for level in chain] == [300, 150, 75, 38, 19, 10, 5, 3, 2, 1]
+    # odd sizes repeat their last row and column
+    np.testing.assert_allclose(chain[3][-1, -1], chain[2][-1, -1])
+    np.testing.assert_allclose(downsample(data[:2, :2]), data[:2, :2].mean(), rtol=1e-6)
+
+
+@pytest.mark.parametrize("levels", [None, 3])
+def test_attached_mips_equal_chain(size, levels):
+    generator, params = make("PerlinNoise", size)
+    field = generator.generate_field(params, mips=True, mip_levels=levels)
+    chain = mip_chain(field.data, levels)
+    assert len(field.mipmaps) == len(chain) - 1
+    assert all(np.array_equal(a, b) for a, b in zip(field.mipmaps, chain[1:]))
+    mips = field.mips(levels)
+    assert mips[0] is field
+    assert all(m.data is a for m, a in zip(mips[1:], field.mipmaps))
+
+
+def test_mips_rebuilt_for_new_data():
+    generator, params = make("WorleyNoise", 64)
+    field = generator.generate_field(params, mips=True)
+    inverted = ModifierStack([(OneMinus(), {})]).apply_field(field)
+    chain = mip_chain(inverted.data)
+    assert all(np.array_equal(a, b) for a, b in zip(inverted.mipmaps, chain[1:]))
+    assert generator.generate_field(params).mipmaps is None
+
+
+def test_cached_mips_are_frozen():
+    generator, params = make("PerlinNoise", 64)
+    field = ResultCache().put("PerlinNoise", params, generator.generate_field(params, mips=True))
+    assert not any(level.flags.writeable for level in field.mipmaps)
+    assert field.nbytes == sum(m.data.nbytes for m in field.mips())
+
+
+@pytest.mark.parametrize("levels", [None, 4])
+def test_write_mips_attached_and_streamed(levels):
+    generator, params = make("SimplexNoise", 300)
+    attached = generator.generate_field(params, mips=True)
+    plain = generator.generate_field(params)
+    files = []
+    for source in (attached, plain):
+        buf = io.BytesIO()
+        write_mips(source, buf, levels)
+        buf.seek(0)
+        files.append(buf)
+    a, b = (NoiseField.load_mips(f) for f in files)
+    assert len(a) == len(b) == (levels or 10)
+    assert all(np.array_equal(x.data, y.data) for x, y in zip(a, b))
+    files[0].seek(0)
+    assert np.array_equal(NoiseField.load_npz(files[0]).data, plain.data)
+
+
+def test_cli_npz_builds_mips_with_the_render(tmp_path):
+    renderer = BatchRenderer()
+    job = {"generator": "PerlinNoise", "params": {"size": 128}, "modifiers": [{"name": "OneMinus"}],
+           "output": str(tmp_path / "m.npz"), "mip_levels": 5}
+    field = renderer.render(job)
+    assert len(field.mipmaps) == 4
+    renderer.run(job)
+    levels = NoiseField.load_mips(tmp_path / "m.npz")
+    chain = mip_chain(field.data, 5)
+    assert len(levels) == 5
+    assert all(np.array_equal(level.data, data) for level, data in zip(levels, chain))
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from field import NoiseField
+from modifiers import FLOAT_BLOCK, BrightnessModifier, ModifierStack, OneMinus, PowerOfX
+
+CHAINS = [
+    [(OneMinus(), {})],
+    [(BrightnessModifier(), {"value": 1.7}), (PowerOfX(), {"value": 2.5})],
+    [(PowerOfX(), {"value": 0.5}), (OneMinus(), {}), (BrightnessModifier(), {"value": 0.8})],
+]
+
+
+def sequential(image, chain):
+    for modifier, params in chain:
+        image = modifier.apply(image, params)
+    return image
+
+
+# 300x300x3 goes through the pair table, 17x17 through the plain one
+@pytest.mark.parametrize("shape", [(300, 300, 3), (17, 17)])
+@pytest.mark.parametrize("chain", CHAINS)
+def test_lut_matches_sequential(chain, shape):
+    image = np.random.default_rng(1).integers(0, 256, shape, dtype=np.uint8)
+    expected = sequential(image.copy(), chain)
+    assert np.array_equal(ModifierStack(chain).apply(image), expected)
+    in_place = image.copy()
+    assert np.array_equal(ModifierStack(chain).apply(in_place, in_place=True), expected)
+
+
+@pytest.mark.parametrize("chain", CHAINS)
+def test_field_matches_sequential(chain):
+    # more than one block
+    data = np.random.default_rng(2).random((FLOAT_BLOCK // 100, 300), dtype=np.float32)
+    expected = data.copy()
+    for modifier, params in chain:
+        modifier.apply_float(expected, params)
+    field = NoiseField(data.copy())
+    result = ModifierStack(chain).apply_field(field)
+    assert np.array_equal(result.data, expected)
+    assert np.array_equal(field.data, data)
+
+
+def test_field_in_place():
+    data = np.random.default_rng(3).random((256, 256), dtype=np.float32)
+    field = NoiseField(data)
+    result = ModifierStack(CHAINS[1]).apply_field(field, in_place=True)
+    assert result.data is data
+
+
+def test_frozen_field_is_copied():
+    data = np.random.default_rng(4).random((64, 64), dtype=np.float32)
+    data.flags.writeable = False
+    result = ModifierStack(CHAINS[0]).apply_field(NoiseField(data), in_place=True)
+    assert result.data is not data
+    assert np.array_equal(result.data, np.float32(1.0) - data)
@@ -0,0 +1,37 @@
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+from PIL import Image
+
+from conftest import make
+import noisegen
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_render_png(tmp_path):
+    path = str(tmp_path / "p.png")
+    assert noisegen.main(["PerlinNoise", "-o", path, "-p", "size=64", "-p", "seed=3", "-m", "OneMinus"]) == 0
+    generator, params = make("PerlinNoise", 64, seed=3)
+    field = generator.generate_field(params)
+    expected = field.with_data(np.float32(1.0) - field.data).to_gray8()
+    assert np.array_equal(np.asarray(Image.open(path).convert("L")), expected)
+
+
+def test_failed_job_exit_code(tmp_path, capsys):
+    assert noisegen.main(["Nope", "-o", str(tmp_path / "x.png")]) == 1
+    assert "Unknown generator 'Nope'" in capsys.readouterr().err
+
+
+def test_cli_never_imports_qt(tmp_path):
+    code = (
+        "import json, sys\n"
+        "import noisegen\n"
+        f"noisegen.main(['WorleyNoise', '-o', {str(tmp_path / 'w.png')!r}, '-p', 'size=32'])\n"
+        "print(json.dumps(any(m.startswith('PyQt') for m in sys.modules)))\n"
+    )
+    proc = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert json.loads(proc.stdout) is False
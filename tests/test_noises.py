@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from conftest import NOISES, make
+from noises import WorleyNoiseGenerator
+from registry import GENERATORS
+
+# every STEP-th pixel for the scalar references, they are slow
+STEP = 7
+
+
+def scalar(fn, size):
+    return np.array([[fn(x, y) for y in range(0, size, STEP)] for x in range(0, size, STEP)])
+
+
+def test_perlin_matches_scalar(size):
+    generator, params = make("PerlinNoise", size, octaves=4)
+    generator.generate_field(params)
+    coords = np.arange(size, dtype=np.float64)
+    data = generator.octave_noise_array(coords[:, None], coords[None, :])
+    assert np.array_equal(data[::STEP, ::STEP], scalar(generator.octave_noise, size))
+
+
+@pytest.mark.filterwarnings("ignore::RuntimeWarning")
+@pytest.mark.parametrize("mode", list(WorleyNoiseGenerator().modes))
+def test_worley_matches_scalar(size, mode):
+    generator, params = make("WorleyNoise", size, mode=mode)
+    generator.generate_field(params)
+    coords = np.arange(size, dtype=np.float64)
+    data = generator.noise_array(coords[:, None], coords[None, :], mode=mode)
+    expected = scalar(lambda x, y: generator.noise(x, y, mode=mode), size)
+    assert np.array_equal(data[::STEP, ::STEP], expected, equal_nan=True)
+
+
+# generate() is the uint8 view of generate_field(), the CLI and GUI share
+# one normalization
+@pytest.mark.parametrize("seed", range(4))
+@pytest.mark.parametrize("name", NOISES)
+def test_generate_matches_field(name, seed):
+    generator, params = make(name, 256, seed=seed)
+    image = generator.generate(params)
+    field = GENERATORS[name]().generate_field(params)
+    assert image.shape == (256, 256, 3) and image.dtype == np.uint8
+    assert np.array_equal(image, field.to_rgb8())
+    if field.channels == 1:
+        assert np.array_equal(image[..., 0], field.to_gray8())
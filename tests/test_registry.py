@@ -0,0 +1,62 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from graph import Graph, GraphError
+from registry import GENERATORS, MODIFIERS, Instances, default_params
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_import_is_light():
+    code = (
+        "import json, sys\n"
+        "import registry\n"
+        "registry.default_params\n"
+        "print(json.dumps(sorted(m for m in sys.modules if m.split('.')[0] in ('numpy', 'PyQt6', 'PIL'))))\n"
+    )
+    proc = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert json.loads(proc.stdout) == []
+
+
+def test_create_names_unknown_entries():
+    assert type(GENERATORS.create("PerlinNoise")).__name__ == "PerlinNoiseGenerator"
+    with pytest.raises(ValueError, match="Unknown generator 'Nope'"):
+        GENERATORS.create("Nope")
+    with pytest.raises(ValueError, match="Unknown modifier 'Nope'"):
+        MODIFIERS.create("Nope")
+
+
+def test_instances_are_kept():
+    instances = Instances(GENERATORS)
+    assert instances["WorleyNoise"] is instances["WorleyNoise"]
+    assert instances["WorleyNoise"] is not Instances(GENERATORS)["WorleyNoise"]
+
+
+def test_default_params():
+    params = default_params(MODIFIERS.create("Brightness"))
+    assert params == {"value": 1.0}
+    assert set(default_params(GENERATORS.create("PerlinNoise"))) >= {"size", "seed", "octaves"}
+
+
+def test_graph_memoizes_subgraphs():
+    graph = Graph(size=64)
+    graph.add_source("a", "PerlinNoise", {"seed": 1})
+    graph.add_source("b", "WorleyNoise")
+    graph.add_modifier("inv", "OneMinus", "b")
+    graph.add_blend("out", "multiply", "a", "inv")
+    graph.output = "out"
+    first = graph.evaluate()
+    misses = graph.cache.misses
+    graph.set_params("a", seed=2)
+    graph.evaluate()
+    # only the changed source and the blend render again, "inv" is reused
+    assert graph.cache.misses == misses + 2
+    graph.set_params("a", seed=1)
+    assert graph.evaluate() is first
+    graph.add_source("c", "Nope")
+    with pytest.raises(GraphError, match="Unknown generator 'Nope'"):
+        graph.evaluate("c")
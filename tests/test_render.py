@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from conftest import NOISES, make
+from registry import GENERATORS
+from render import render_progressive, render_tiled
+
+
+@pytest.mark.parametrize("name", NOISES)
+def test_tiled_matches_field(name, size, tmp_path):
+    generator, params = make(name, size)
+    data = render_tiled(generator, params, str(tmp_path / "tiled.npy"), tile_size=128)
+    assert np.array_equal(data, GENERATORS[name]().generate_field(params).data)
+    assert [p.name for p in tmp_path.iterdir()] == ["tiled.npy"]
+
+
+def test_tiled_needs_regions(tmp_path):
+    generator, params = make("Checkerboard", 64)
+    with pytest.raises(ValueError, match="Checkerboard"):
+        render_tiled(generator, params, str(tmp_path / "tiled.npy"))
+
+
+@pytest.mark.parametrize("name", NOISES)
+def test_tiled_workers(name, tmp_path):
+    generator, params = make(name, 300)
+    single = render_tiled(generator, params, str(tmp_path / "single.npy"), tile_size=128)
+    pooled = render_tiled(generator, params, str(tmp_path / "pooled.npy"), tile_size=128, workers=2)
+    assert np.array_equal(single, pooled)
+
+
+@pytest.mark.parametrize("name", NOISES)
+def test_progressive_matches_full(name, size):
+    generator, params = make(name, size)
+    levels = list(render_progressive(generator, params, preview_size=16))
+    strides = [stride for stride, _ in levels]
+    assert strides == sorted(strides, reverse=True) and strides[-1] == 1
+    assert np.array_equal(levels[-1][1].data, GENERATORS[name]().generate_field(params).data)
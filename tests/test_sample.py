@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+from conftest import make
+
+
+@pytest.mark.parametrize("name", ["PerlinNoise", "WorleyNoise"])
+def test_sample_matches_render(name):
+    generator, params = make(name, 96)
+    generator.setup(params)
+    coords = np.arange(96, dtype=np.float64)
+    raw = generator.evaluate(coords, coords)
+    scale = params["grid_size"] / params["size"]
+    values = generator.sample(coords[:, None] * scale, coords[None, :] * scale, normalize=False)
+    # Perlin samples use the Horner form of the fade
+    np.testing.assert_allclose(values, raw, rtol=0, atol=1e-12)
+
+
+@pytest.mark.parametrize("name", ["PerlinNoise", "WorleyNoise"])
+def test_sample_is_random_access(name):
+    generator, params = make(name, 64)
+    rng = np.random.default_rng(5)
+    xs, ys = rng.uniform(-50, 50, (2, 10000))
+    values = generator.sample(xs, ys, params)
+    assert values.shape == xs.shape and 0.0 <= values.min() and values.max() <= 1.0
+    # fixed normalization: a point doesn't depend on the rest of the batch
+    assert np.array_equal(generator.sample(xs[:3], ys[:3]), values[:3])
+    assert np.array_equal(generator.sample(xs[5], ys[5]), values[5])
+    # Worley repeats every grid_size cells, Perlin with its 256 entry table
+    period = params["grid_size"] if name == "WorleyNoise" else 256
+    np.testing.assert_allclose(generator.sample(xs + period, ys - period), values, atol=1e-9)
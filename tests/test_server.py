@@ -0,0 +1,85 @@
+import json
+import threading
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+import numpy as np
+import pytest
+
+from cache import ResultCache
+from conftest import make
+from server import RenderService, make_server, render_remote
+
+
+@pytest.fixture(scope="module")
+def service():
+    service = RenderService(workers=2, cache=ResultCache())
+    yield service
+    service.close()
+
+
+@pytest.fixture(scope="module")
+def url(service):
+    server = make_server(service, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def post(url, body):
+    request = Request(url + "/render", json.dumps(body).encode(), {"Content-Type": "application/json"})
+    try:
+        with urlopen(request) as response:
+            return response.status, dict(response.headers), response.read()
+    except HTTPError as e:
+        return e.code, dict(e.headers), e.read()
+
+
+def test_identical_requests_share_one_render(service):
+    job = {"generator": "PerlinNoise", "params": {"size": 1024, "octaves": 8, "seed": 91}}
+    start = threading.Barrier(6)
+    results = [None] * 6
+
+    def request(k):
+        start.wait()
+        results[k] = service.render(job)
+
+    threads = [threading.Thread(target=request, args=(k,)) for k in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    statuses = [status for _, status in results]
+    assert statuses.count("miss") == 1 and set(statuses) <= {"miss", "shared", "hit"}
+    assert all(field is results[0][0] for field, _ in results)
+    assert service.render(job)[1] == "hit"
+    assert service.stats()["inflight"] == 0
+
+
+def test_render_matches_local(url):
+    job = {"generator": "WorleyNoise", "params": {"size": 96, "seed": 4}, "modifiers": [{"name": "OneMinus"}]}
+    field = render_remote(job, url)
+    generator, params = make("WorleyNoise", 96, seed=4)
+    assert np.array_equal(field.data, np.float32(1.0) - generator.generate_field(params).data)
+    status, headers, _ = post(url, dict(job, format="png"))
+    assert status == 200 and headers["X-Cache"] == "hit" and headers["Content-Type"] == "image/png"
+
+
+@pytest.mark.parametrize("body, message", [
+    ({"generator": "Nope"}, "Unknown generator 'Nope'"),
+    ({"generator": "PerlinNoise", "modifiers": [{"name": "Nope"}]}, "Unknown modifier 'Nope'"),
+    ({"generator": "PerlinNoise", "format": "gif"}, "Unknown format 'gif'"),
+])
+def test_bad_requests(url, body, message):
+    status, _, payload = post(url, body)
+    assert status == 400
+    assert json.loads(payload)["error"].startswith(message)
+
+
+def test_unknown_path(url):
+    with pytest.raises(HTTPError) as e:
+        urlopen(url + "/nope")
+    assert e.value.code == 404
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from conftest import make
+from viewport import Viewport
+
+
+def explore(name, **params):
+    generator, params = make(name, 256, **params)
+    viewport = Viewport(tile_size=64)
+    viewport.set_source(name, generator, params)
+    viewport.center_on(128, 128)
+    return viewport, generator, params
+
+
+@pytest.mark.parametrize("name", ["PerlinNoise", "WorleyNoise", "SimplexNoise"])
+def test_tiles_match_evaluate(name):
+    viewport, generator, params = explore(name)
+    field = viewport.render(200, 150)
+    assert field.data.shape == (150, 200)
+    # screen pixel (row, col) is world (center + offset / zoom)
+    xs = np.arange(150, dtype=np.float64) + 128 - 75
+    ys = np.arange(200, dtype=np.float64) + 128 - 100
+    lo, hi = generator.value_bounds()
+    expected = np.clip((generator.evaluate(xs, ys) - lo) * (1.0 / (hi - lo)), 0.0, 1.0).astype(np.float32)
+    np.testing.assert_allclose(field.data, expected, atol=1e-6)
+
+
+def test_pan_reuses_tiles():
+    viewport, _, _ = explore("PerlinNoise")
+    first = viewport.render(128, 128)
+    assert viewport.last_rendered == viewport.last_visible == 4
+    viewport.pan(64, 0)
+    viewport.pan(-64, 0)
+    again = viewport.render(128, 128)
+    assert viewport.last_rendered == 0
+    assert np.array_equal(first.data, again.data)
+
+
+@pytest.mark.parametrize("name, cache", [("PerlinNoise", "layer_cache"), ("WorleyNoise", "distance_cache")])
+def test_generator_caches_stay_untouched(name, cache):
+    generator, _ = make(name, 256)
+    layers = getattr(generator, cache)
+    layers.clear()
+    budget = layers.max_bytes
+    viewport, _, _ = explore(name)
+    for step in range(4):
+        viewport.zoom_at(1.5, 10 * step, 20, 128, 128)
+        viewport.render(128, 128)
+    assert len(layers) == 0 and layers.max_bytes == budget
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from conftest import make
+from volumes import VOLUMES, iter_frames, iter_volume, write_frames, write_volume
+
+NAMES = list(VOLUMES)
+
+
+def volume(name, size=32):
+    _, params = make(name, size)
+    return VOLUMES[name](), params
+
+
+@pytest.mark.parametrize("name", NAMES)
+def test_write_volume_streams_slices(name, tmp_path):
+    vol, params = volume(name)
+    expected = np.stack([data for _, data in iter_volume(VOLUMES[name](), params, depth=12)])
+    out = write_volume(vol, params, str(tmp_path / "v.npy"), depth=12)
+    assert out.shape == (12, 32, 32) and out.dtype == np.float32
+    assert np.array_equal(np.load(tmp_path / "v.npy"), expected)
+    assert 0.0 <= expected.min() and expected.max() <= 1.0
+    # neighbouring slices are close, far ones are not the same field
+    assert np.abs(expected[1] - expected[0]).mean() < np.abs(expected[11] - expected[0]).mean()
+
+
+@pytest.mark.parametrize("name", NAMES)
+def test_slices_are_random_access(name):
+    vol, params = volume(name)
+    frames = dict(iter_frames(vol, params, 6, speed=2.5))
+    _, later = next(iter_frames(VOLUMES[name](), params, 1, start=10.0))
+    assert np.array_equal(frames[10.0], later)
+
+
+@pytest.mark.parametrize("name", NAMES)
+def test_volume_wraps(name):
+    vol, params = volume(name)
+    # Worley repeats every grid_size cells, Perlin every 256 lattice units
+    cells = params["grid_size"] if name == "WorleyNoise" else 256
+    period = cells * params["size"] / params["grid_size"]
+    (_, first), (_, wrapped) = iter_frames(vol, params, 2, speed=period, start=3.0)
+    np.testing.assert_allclose(first, wrapped, atol=1e-6)
+
+
+def test_write_frames(tmp_path):
+    vol, params = volume("WorleyNoise")
+    paths = write_frames(vol, params, str(tmp_path / "f_{:02d}.png"), 3)
+    assert [p.rsplit("/", 1)[1] for p in paths] == ["f_00.png", "f_01.png", "f_02.png"]
+    _, data = next(iter_frames(VOLUMES["WorleyNoise"](), params, 1, start=2.0))
+    assert np.array_equal(np.asarray(Image.open(paths[2])), (np.clip(data, 0, 1) * 255).astype(np.uint8))
@@ -0,0 +1,140 @@
+import math
+from collections import OrderedDict
+
+import numpy as np
+
+import profiling
+from base import supports_regions
+from cache import canonical_params
+from field import NoiseField
+
+# Pan/zoom view over an unbounded noise field.
+#
+# Only the pixels on screen are evaluated, at screen resolution: screen
+# pixel (row, col) shows the field at world coords center + offset / zoom,
+# world coords being the pixel coords of the texture size params["size"].
+# The screen is split into tiles anchored in world space for every zoom, so
+# panning reuses the tiles still visible and only evaluates the ones coming
+# into view. Values are normalized by generator.value_bounds() instead of
+# the min/max of what is visible, so tiles agree with each other.
+
+VIEW_TILE = 128
+VIEW_CACHE_TILES = 512
+MIN_ZOOM = 1.0 / 64
+MAX_ZOOM = 64.0
+
+
+class Viewport:
+    def __init__(self, tile_size=VIEW_TILE, max_tiles=VIEW_CACHE_TILES):
+        self.tile_size = tile_size
+        self.max_tiles = max_tiles
+        self.generator = None
+        self.source_key = None
+        self.bounds = None
+        self.modifiers = None
+        # world coords of the screen center, rows (x) and columns (y)
+        self.center_x = 0.0
+        self.center_y = 0.0
+        self.zoom = 1.0
+        self.tiles = OrderedDict()
+        # tiles evaluated / shown by the last render()
+        self.last_rendered = 0
+        self.last_visible = 0
+
+    def set_source(self, name, generator, params):
+        """
+        Show generator with params, set up here. Tiles of earlier sources stay
+        cached. The generator's own layer caches are turned off, tiles are
+        kept here instead and every pan or zoom asks for new regions.
+        """
+        if not supports_regions(generator):
+            raise ValueError(f"{name} can't be shown in the viewport")
+        generator.use_cache = False
+        generator.setup(params)
+        if generator.value_bounds() is None:
+            raise ValueError(f"{name} has no fixed value range for the viewport")
+        self.generator = generator
+        self.source_key = name + "|" + canonical_params(params)
+        self.bounds = generator.value_bounds()
+
+    def center_on(self, x, y):
+        self.center_x = float(x)
+        self.center_y = float(y)
+
+    def pan(self, dx, dy):
+        """Move the view by a drag of (dx, dy) screen pixels, dx to the right."""
+        self.center_y -= dx / self.zoom
+        self.center_x -= dy / self.zoom
+
+    def zoom_at(self, factor, px, py, width, height):
+        """Scale zoom by factor keeping the world point under screen pixel (px, py) in place."""
+        zoom = min(max(self.zoom * factor, MIN_ZOOM), MAX_ZOOM)
+        # world point under the cursor before and after
+        off_y = px - width / 2
+        off_x = py - height / 2
+        world_y = self.center_y + off_y / self.zoom
+        world_x = self.center_x + off_x / self.zoom
+        self.zoom = zoom
+        self.center_y = world_y - off_y / zoom
+        self.center_x = world_x - off_x / zoom
+
+    def set_zoom(self, zoom):
+        self.zoom = min(max(zoom, MIN_ZOOM), MAX_ZOOM)
+
+    def _tile(self, tr, tc):
+        key = (self.source_key, self.zoom, tr, tc)
+        tile = self.tiles.get(key)
+        if tile is not None:
+            self.tiles.move_to_end(key)
+            return tile
+
+        t = self.tile_size
+        offsets = np.arange(t, dtype=np.float64)
+        xs = (tr * t + offsets) / self.zoom
+        ys = (tc * t + offsets) / self.zoom
+        lo, hi = self.bounds
+        raw = self.generator.evaluate(xs, ys)
+        tile = np.clip((raw - lo) * (1.0 / (hi - lo)), 0.0, 1.0).astype(np.float32)
+        self.last_rendered += 1
+
+        self.tiles[key] = tile
+        if len(self.tiles) > self.max_tiles:
+            self.tiles.popitem(last=False)
+        return tile
+
+    def render(self, width, height) -> NoiseField:
+        """Field of the visible (height, width) screen pixels."""
+        if self.generator is None:
+            raise ValueError("No source set")
+        t = self.tile_size
+        # screen pixels of the top left corner in the zoomed world grid
+        r0 = math.floor(self.center_x * self.zoom - height / 2)
+        c0 = math.floor(self.center_y * self.zoom - width / 2)
+
+        self.last_rendered = 0
+        self.last_visible = 0
+        out = None
+        with profiling.stage("viewport", pixels=width * height) as s:
+            for tr in range(r0 // t, (r0 + height - 1) // t + 1):
+                for tc in range(c0 // t, (c0 + width - 1) // t + 1):
+                    tile = self._tile(tr, tc)
+                    if out is None:
+                        out = np.empty((height, width) + tile.shape[2:], dtype=np.float32)
+                    self.last_visible += 1
+
+                    # overlap of the tile with the screen, in screen coords
+                    top = max(tr * t - r0, 0)
+                    left = max(tc * t - c0, 0)
+                    bottom = min(tr * t + t - r0, height)
+                    right = min(tc * t + t - c0, width)
+                    out[top:bottom, left:right] = tile[top + r0 - tr * t:bottom + r0 - tr * t,
+                                                       left + c0 - tc * t:right + c0 - tc * t]
+            s.nbytes = out.nbytes
+
+        field = NoiseField(out, type(self.generator).__name__, {"zoom": self.zoom})
+        if self.modifiers is not None:
+            field = self.modifiers.apply_field(field, in_place=True)
+        return field
+
+    def clear(self):
+        self.tiles.clear()
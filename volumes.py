@@ -0,0 +1,259 @@
+import math
+
+import numpy as np
+
+import profiling
+from field import NoiseField
+from noises import PerlinNoiseGenerator, WorleyNoiseGenerator
+
+# 3D noise streamed one z slice at a time, for volumes (clouds) and
+# animations (z is time).
+#
+#   volume = PerlinVolume()
+#   for z, data in iter_volume(volume, params, depth=256): ...
+#   write_volume(volume, params, "clouds.npy")
+#   write_frames(volume, params, "frames/f_{:04d}.png", frames=600, speed=0.5)
+#
+# Params are the ones of the 2D generator. prepare() works out everything
+# that only depends on the xy plane once (lattice cells, fades, the first two
+# permutation lookups or neighbour cells), so each slice only adds the z part
+# and memory does not grow with depth or frame count.
+# Values are mapped to [0, 1] by fixed bounds like sample() in noises.py, so
+# every slice is normalized the same way. Both volumes wrap seamlessly, an
+# animation loops after 256 / grid_size (Perlin) or grid_size (Worley)
+# lattice units.
+
+
+
+class PerlinVolume:
+    # Gradients of improved Perlin noise: the 12 cube edge directions padded
+    # to 16 so a hash picks one with & 15
+    grads = np.array([
+        (1, 1, 0), (-1, 1, 0), (1, -1, 0), (-1, -1, 0),
+        (1, 0, 1), (-1, 0, 1), (1, 0, -1), (-1, 0, -1),
+        (0, 1, 1), (0, -1, 1), (0, 1, -1), (0, -1, -1),
+        (1, 1, 0), (-1, 1, 0), (0, -1, 1), (0, -1, -1),
+    ], dtype=np.float64)
+
+    # |noise| of one octave stays within about 1 with these gradients
+    bound = 1.0
+
+    def get_ui_schema(self):
+        return PerlinNoiseGenerator().get_ui_schema()
+
+    def setup(self, params):
+        self.size = params["size"]
+        self.grid_size = params["grid_size"]
+        self.octaves = params["octaves"]
+        self.persistance = params["persistance"]
+        self.seed = params["seed"]
+
+        # same permutation table as the 2D generator for this seed
+        flat = PerlinNoiseGenerator()
+        flat._generate_vectors(np.random.RandomState(self.seed))
+        self.table = flat.table.astype(np.intp)
+        self.plane = None
+
+    @staticmethod
+    def _fade(t):
+        return t * t * t * (t * (t * 6 - 15) + 10)
+
+    def prepare(self, xs, ys):
+        table = self.table
+        self.plane = []
+        frequency = self.grid_size / self.size
+        for i in range(self.octaves):
+            x = np.asarray(xs, dtype=np.float64) * frequency
+            y = np.asarray(ys, dtype=np.float64) * frequency
+            x0 = np.floor(x).astype(np.intp) % 256
+            y0 = np.floor(y).astype(np.intp) % 256
+            fx = (x - np.floor(x))[:, None]
+            fy = (y - np.floor(y))[None, :]
+            a = table[x0][:, None]
+            b = table[(x0 + 1) % 256][:, None]
+            y0 = y0[None, :]
+            y1 = (y0 + 1) % 256
+            # partial hashes table[table[x] + y] of the four xy corners
+            corners = [table[a + y0], table[a + y1], table[b + y0], table[b + y1]]
+            corners = [c.astype(np.uint16) for c in corners]
+            self.plane.append((frequency, fx, fy, self._fade(fx), self._fade(fy), corners))
+            frequency *= 2.0
+
+    def _octave(self, plane, z):
+        frequency, fx, fy, u, v, corners = plane
+        z *= frequency
+        z0 = int(math.floor(z)) % 256
+        z1 = (z0 + 1) % 256
+        fz = z - math.floor(z)
+        w = float(self._fade(fz))
+
+        gx, gy, gz = self.grads[:, 0], self.grads[:, 1], self.grads[:, 2]
+        values = []
+        for (ox, oy), corner in zip(((0, 0), (0, 1), (1, 0), (1, 1)), corners):
+            dx = fx - ox
+            dy = fy - oy
+            for oz, zc in ((0, z0), (1, z1)):
+                g = self.table[corner + zc] & 15
+                values.append(gx[g] * dx + gy[g] * dy + gz[g] * (fz - oz))
+        # values are ordered (x, y, z) = 000, 001, 010, 011, 100, 101, 110, 111
+        x00 = values[0] + u * (values[4] - values[0])
+        x01 = values[1] + u * (values[5] - values[1])
+        x10 = values[2] + u * (values[6] - values[2])
+        x11 = values[3] + u * (values[7] - values[3])
+        y0 = x00 + v * (x10 - x00)
+        y1 = x01 + v * (x11 - x01)
+        return y0 + w * (y1 - y0)
+
+    def evaluate_slice(self, z):
+        total = None
+        amplitude = self.persistance
+        for plane in self.plane:
+            octave = amplitude * self._octave(plane, float(z))
+            total = octave if total is None else total + octave
+            amplitude *= 0.5
+        return total
+
+    def to_unit(self, values):
+        bound = self.bound * abs(self.persistance) * (2.0 - 0.5 ** (self.octaves - 1)) or 1.0
+        values = values * (0.5 / bound) + 0.5
+        return np.clip(values, 0.0, 1.0, out=values).astype(np.float32)
+
+
+
+class WorleyVolume:
+    # Fixed ranges per mode in cell units, with one feature point per cell
+    # F1 <= sqrt(3) and F2 <= sqrt(6)
+    sample_ranges = {
+        "F1": (0.0, math.sqrt(3)),
+        "F2": (0.0, math.sqrt(6)),
+        "F2 + F1": (0.0, math.sqrt(3) + math.sqrt(6)),
+        "F2 - F1": (0.0, math.sqrt(6)),
+        "F2 * F1": (0.0, math.sqrt(18)),
+        "F2 / F1": (1.0, 8.0),
+        "sqrt(F2 * F1)": (0.0, 18 ** 0.25),
+        "sin(F1 * X)": (-1.0, 1.0),
+        "cos(F1 * X)": (-1.0, 1.0),
+    }
+
+    def get_ui_schema(self):
+        return WorleyNoiseGenerator().get_ui_schema()
+
+    def setup(self, params):
+        self.size = params["size"]
+        self.grid_size = params["grid_size"]
+        self.seed = params["seed"]
+        self.mode = params["mode"]
+
+        flat = WorleyNoiseGenerator()
+        flat.value = params["value"]
+        self.combine = flat.modes[self.mode]
+
+        # offset of the feature point inside each cell
+        g = self.grid_size
+        rng = np.random.RandomState(self.seed)
+        with profiling.stage("points", pixels=g * g * g):
+            self.points = rng.random_sample((g, g, g, 3))
+        self.plane = None
+
+    def prepare(self, xs, ys):
+        scale = self.grid_size / self.size
+        x = np.asarray(xs, dtype=np.float64) * scale
+        y = np.asarray(ys, dtype=np.float64) * scale
+        cell_x = np.floor(x).astype(np.intp)
+        cell_y = np.floor(y).astype(np.intp)
+        # per neighbour offset: wrapped cell index and position relative to
+        # the cell the pixel is in
+        g = self.grid_size
+        self.plane = (
+            [((cell_x + d) % g, x - cell_x - d) for d in (-1, 0, 1)],
+            [((cell_y + d) % g, y - cell_y - d) for d in (-1, 0, 1)],
+        )
+
+    def evaluate_slice(self, z):
+        z = float(z) * self.grid_size / self.size
+        cell_z = math.floor(z)
+        near_xs, near_ys = self.plane
+        shape = (len(near_xs[0][0]), len(near_ys[0][0]))
+        f1 = np.full(shape, np.inf)
+        f2 = np.full(shape, np.inf)
+        for dz in (-1, 0, 1):
+            layer = self.points[:, :, (cell_z + dz) % self.grid_size]
+            rz = z - cell_z - dz
+            for near_x, rx in near_xs:
+                rows = layer[near_x]
+                dx2 = (rows[:, :, 0] - rx[:, None]) ** 2
+                for near_y, ry in near_ys:
+                    cells = rows[:, near_y]
+                    ddy = cells[:, :, 1] - ry[None, :]
+                    ddz = cells[:, :, 2] - rz
+                    dist = np.sqrt(dx2[:, near_y] + ddy * ddy + ddz * ddz)
+
+                    np.minimum(f2, np.maximum(f1, dist), out=f2)
+                    np.minimum(f1, dist, out=f1)
+        return self.combine(f1, f2)
+
+    def to_unit(self, values):
+        lo, hi = self.sample_ranges[self.mode]
+        values = (values - lo) / (hi - lo)
+        return np.clip(values, 0.0, 1.0, out=values).astype(np.float32)
+
+
+
+VOLUMES = {
+    "PerlinNoise": PerlinVolume,
+    "WorleyNoise": WorleyVolume,
+}
+
+
+def iter_slices(volume, params, zs):
+    """Yields (z, float32 slice of shape (size, size)) for every z in zs, in pixel units."""
+    volume.setup(params)
+    size = params["size"]
+    coords = np.arange(size, dtype=np.float64)
+    volume.prepare(coords, coords)
+    for z in zs:
+        with profiling.stage("slice", pixels=size * size) as s:
+            data = volume.to_unit(volume.evaluate_slice(z))
+            s.nbytes = data.nbytes
+        yield z, data
+
+
+def iter_volume(volume, params, depth=None):
+    """Slices z = 0 .. depth - 1 of a cube with the voxel pitch of the xy plane."""
+    depth = params["size"] if depth is None else depth
+    return iter_slices(volume, params, range(depth))
+
+
+def iter_frames(volume, params, frames, speed=1.0, start=0.0):
+    """Animation frames, z moves by speed pixels per frame."""
+    return iter_slices(volume, params, (start + i * speed for i in range(frames)))
+
+
+def write_volume(volume, params, path, depth=None, dtype=np.float32):
+    """Streams a (depth, size, size) volume into a .npy memmap at path and returns it."""
+    size = params["size"]
+    depth = size if depth is None else depth
+    out = np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=(depth, size, size))
+    for k, (_, data) in enumerate(iter_volume(volume, params, depth)):
+        out[k] = data
+    out.flush()
+    return out
+
+
+def write_frames(volume, params, pattern, frames, speed=1.0, start=0.0):
+    """
+    Writes frames to pattern.format(index), e.g. "out/frame_{:04d}.png".
+    .npy frames keep float32 values, anything else is 8-bit grayscale via PIL.
+    Returns the written paths.
+    """
+    paths = []
+    for i, (_, data) in enumerate(iter_frames(volume, params, frames, speed, start)):
+        path = pattern.format(i)
+        if path.endswith(".npy"):
+            np.save(path, data)
+        else:
+            from PIL import Image
+
+            Image.fromarray(NoiseField(data).to_gray8()).save(path)
+        paths.append(path)
+    return paths